@@ -1,6 +1,7 @@
 # written by Luke Thistlethwaite
 import pickle
 import random
+import numpy as np
 with open('data/bundle_info.p', 'rb') as f:
     bundle_dict = pickle.load(f) #maps bundles -> List[str] of series
 with open('data/total_series_info.p', 'rb') as f:
@@ -26,24 +27,27 @@ for s in server_disabled_series:
     server_disabled_wa += wa_chars
 print("Waifus disabled according to server settings:", server_disabled_wa)
 
+#index every series so sets of series are boolean arrays instead of python sets
+series_list = list(dict.fromkeys(s for b in bundle_dict for s in bundle_dict[b]))
+series_index = {s: i for i, s in enumerate(series_list)}
+bundle_series = {b: np.array([series_index[s] for s in bundle_dict[b]], np.int64) for b in bundle_dict}
+num_char = np.array([series_dict.get(s, (0, 0, 0))[-1] for s in series_list])
+top_kak, _, wa_chars = np.array([wa_series_dict.get(s, (0, 0, 0)) for s in series_list]).T
+bundle_count = {b: int(num_char[bundle_series[b]].sum()) for b in bundle_dict}
+server_disabled_mask = np.zeros(len(series_list), bool)
+server_disabled_mask[[series_index[s] for s in server_disabled_series]] = True
+
 #Function that takes in a list of bundles and determines how many waifus are disabled as well as overlap
 def calc_disabled(bundles, flag=False):
     """returns tuple (disabled_count, num_wa_disabled)"""
-    disabled_series = set()
-    disabled_count = 0
-    unique_wa = 0
-    anti_disable = 0
+    disabled_count = sum(bundle_count[b] for b in bundles) #overlap counts a series once per bundle
+    disabled_series = np.zeros(len(series_list), bool)
     for b in bundles:
-        for s in bundle_dict[b]: #for each series in the bundle
-            _, _, num_char = series_dict[s] #get number of character in series
-            disabled_count += num_char #add to overlap counter
-            if s not in disabled_series and s not in server_disabled_series: #if the series isn't already disabled, it means the waifus are new
-                disabled_series.add(s) #add to disable list
-                top_kak, _, wa_chars = wa_series_dict[s] #find out top value of waifu
-                if top_kak > 83:
-                    anti_disable += 1 #waifu should be anti_disabled if worth stuff
-                else:
-                    unique_wa += wa_chars #otherwise it'll be disabled, add to list of unique disabled waifus
+        disabled_series[bundle_series[b]] = True
+    disabled_series &= ~server_disabled_mask #only the waifus that are new
+    worth = top_kak > 83 #waifu should be anti_disabled if worth stuff
+    anti_disable = int(np.count_nonzero(disabled_series & worth))
+    unique_wa = int(wa_chars[disabled_series & ~worth].sum()) #otherwise it'll be disabled
     if flag:
         return (disabled_count, unique_wa, anti_disable)
     return (disabled_count, unique_wa)
@@ -1,13 +1,11 @@
-import random, bisect
+import random
 import prob, model
+from problib.rv import RandomVariable
 
 random.seed(1)
 ITERS = 10**5
-
-def sample(X: list, F: list) -> float:
-    """ Samples a value from a random variable. """
-    p = random.random()
-    return X[bisect.bisect(F, p) - 1]
+# alias table built once, O(1) per sample
+K = RandomVariable(prob.X, prob.F, is_cmf=True)
 
 def simulate(m: model.Model) -> float:
     """ Simulates a game. """
@@ -20,7 +18,7 @@ def simulate(m: model.Model) -> float:
         # in the case of an offset, remove the offset first
         if len(l) == prob.B or len(l) == offset:
             l, offset = [], -1
-        k = sample(prob.X, prob.F)
+        k = K.sample()
         l.append(k)
         # give kakera value to the model 
         i = m.update(k)
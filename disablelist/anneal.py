@@ -0,0 +1,132 @@
+import os, time
+from multiprocessing import Pool
+import numpy as np
+from scipy import sparse
+from problib.data import *
+from problib.data import bundle_dict, size, series_dict
+from problib.incremental import Evaluator
+from disablelist.ilp import report
+### simulated annealing directly on the model's expected value
+"""
+moves add, remove or swap a disabled bundle/series or toggle an antidisabled
+series, every candidate move is scored exactly with the incremental
+evaluator and one is drawn with probability proportional to exp(gain/T)
+"""
+DISABLE_SERIES, ANTIDISABLE = True, True  # whether to [anti]disable series
+TIME = 60                      # time budget of each restart in seconds
+RESTARTS = os.cpu_count()      # number of independent restarts
+CANDIDATES = 64                # moves scored per step
+T0, T1 = 1, 10**-3             # initial and final temperature
+PROGRESS = 5                   # seconds between progress reports
+
+class Search:
+
+    """ A feasible disable configuration and the moves around it. """
+
+    def __init__(self, seed: int=None) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.ev = Evaluator([], [])
+        # disablable items, bundles then series, as evaluator series indices
+        series = series_list if DISABLE_SERIES else []
+        self.items = bundle_list + series
+        self.members = [np.array([self.ev.index[s] for s in l], np.int64)
+                        for l in [bundle_dict[b] for b in bundle_list] +
+                        [[s] for s in series]]
+        self.sizes = np.array([size[b] for b in bundle_list] +
+                              [series_dict[s][-1] for s in series])
+        self.x = np.zeros(len(self.items), bool)
+        self.cover = np.zeros(len(self.ev.series), np.int64)
+        self.anti = np.zeros(len(self.ev.series), bool)
+
+    def lists(self) -> tuple:
+        """ The current disable list and antidisable list. """
+        return [self.items[i] for i in np.flatnonzero(self.x)], \
+            [self.ev.series[i] for i in np.flatnonzero(self.anti)]
+
+    def delta(self, remove: list, add: list, anti: list) -> tuple:
+        """ Series affected by a move, their new cover counts and
+        antidisabled flags and the change in whether they're enabled. """
+        i = np.unique(np.concatenate([self.members[j] for j in remove + add]
+                                     + [np.array(anti, np.int64)]))
+        cover, flag = self.cover[i].copy(), self.anti[i].copy()
+        for j, sign in [(j, -1) for j in remove] + [(j, 1) for j in add]:
+            cover[np.searchsorted(i, self.members[j])] += sign
+        flag[np.searchsorted(i, anti)] ^= True
+        # a series can only stay antidisabled while it's disabled
+        flag &= cover > 0
+        on = (cover == 0) | flag
+        return i, cover, flag, on.astype(np.int64) - self.ev.on[i]
+
+    def moves(self, n: int) -> list:
+        """ Up to n random feasible moves from the current configuration. """
+        on, off = np.flatnonzero(self.x), np.flatnonzero(~self.x)
+        covered = np.flatnonzero(self.cover > 0)
+        count, total = len(on), self.sizes[on].sum()
+        kinds = ["add", "remove", "swap"] + \
+            (["anti"] if ANTIDISABLE and len(covered) > 0 else [])
+        pick = lambda l: self.rng.choice(l, n).tolist() if len(l) > 0 \
+            else [None]*n
+        moves = []
+        for kind, r, a, s in zip(self.rng.choice(kinds, n), pick(on),
+                                 pick(off), pick(covered)):
+            remove = [r] if kind in ["remove", "swap"] and r is not None \
+                else []
+            add = [a] if kind in ["add", "swap"] and a is not None else []
+            anti = [s] if kind == "anti" else []
+            # stay within the disable, overlap and antidisable limits
+            if count - len(remove) + len(add) > NUM_DISABLE or \
+               total - self.sizes[remove].sum() + self.sizes[add].sum() > \
+               OVERLAP or (len(anti) > 0 and not self.anti[s] and
+                           self.anti.sum() >= NUM_ANTIDISABLE):
+                continue
+            if remove or add or anti:
+                moves.append((remove, add, anti))
+        return moves
+
+    def step(self, T: float) -> None:
+        """ Scores candidate moves and applies one drawn by its gain. """
+        moves = self.moves(CANDIDATES)
+        if len(moves) == 0:
+            return
+        deltas = [self.delta(*move) for move in moves]
+        D = sparse.csr_matrix(
+            (np.concatenate([d for *_, d in deltas]),
+             np.concatenate([i for i, *_ in deltas]),
+             np.cumsum([0] + [len(i) for i, *_ in deltas])),
+            shape=(len(moves), len(self.ev.series)))
+        gain = self.ev.moves(D) - self.ev.value()
+        # staying put is always a candidate with a gain of 0
+        weight = np.exp((np.append(gain, 0) - max(gain.max(), 0))/T)
+        k = self.rng.choice(len(weight), p=weight/weight.sum())
+        if k < len(moves):
+            (remove, add, _), (i, cover, flag, d) = moves[k], deltas[k]
+            self.x[remove], self.x[add] = False, True
+            self.cover[i], self.anti[i] = cover, flag
+            self.ev.apply(i, d)
+
+def anneal(seed: int, budget: float=TIME) -> tuple:
+    """ Anneals from an empty configuration, returning the best found. """
+    search = Search(seed)
+    best = (search.ev.value(), *search.lists())
+    start, steps, report_at = time.perf_counter(), 0, PROGRESS
+    while (elapsed := time.perf_counter() - start) < budget:
+        T = T0*(T1/T0)**(elapsed/budget)
+        search.step(T)
+        steps += 1
+        if search.ev.value() > best[0]:
+            best = (search.ev.value(), *search.lists())
+        if elapsed >= report_at:
+            report_at += PROGRESS
+            print(f"restart {seed} at {elapsed:.0f}s: T = {T:.2e}, current \
+{search.ev.value():.3f}, best {best[0]:.3f}, {steps/elapsed:,.0f} steps/sec",
+                  flush=True)
+    return best
+
+if __name__ == "__main__":
+    with Pool(RESTARTS) as pool:
+        results = pool.map(anneal, range(RESTARTS))
+    for i, (value, _, _) in enumerate(results):
+        print(f"restart {i}: {value:.3f}")
+    value, disable_list, antidisable_list = max(results)
+    print(f"expected value: {value:.3f}")
+    report(disable_list, antidisable_list if ANTIDISABLE else None)
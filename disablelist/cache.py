@@ -0,0 +1,80 @@
+import hashlib, json, os
+from mip import Model, OptimizationStatus
+from problib import cache, data
+### on-disk cache of ILP models and their solutions
+"""
+each entry is keyed by a hash of the compiled dataset, the limits and the
+parameters of the model, and holds the model (.lp or .mps), its solution
+(.sol, to warm start from) and the lists it corresponds to (.json)
+"""
+FOLDER = "ilp_cache" # folder holding the cache
+LIMIT = 1 << 28      # maximum size of the cache in bytes
+MODEL = ".lp"        # format the model is saved in, ".lp" or ".mps"
+
+def key(name: str, files: list=[], **params) -> str:
+    """ Hash of the dataset, the limits, the parameters of a model and any
+    other files its objective depends on. """
+    h = hashlib.sha256(cache.digest(data.SOURCES + files).encode())
+    h.update(json.dumps({"name": name, "NUM_DISABLE": data.NUM_DISABLE,
+                         "OVERLAP": data.OVERLAP,
+                         "NUM_ANTIDISABLE": data.NUM_ANTIDISABLE,
+                         "server": data.server_disabled_list, **params},
+                        sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+def path(k: str, ext: str) -> str:
+    """ Path of a file of an entry. """
+    return f"{FOLDER}/{k}{ext}"
+
+def load(k: str) -> dict:
+    """ The cached lists and objective of an entry, None if missing. """
+    try:
+        with open(path(k, ".json")) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # mark as recently used for eviction
+    os.utime(path(k, ".json"))
+    return entry
+
+def optimal(k: str) -> dict:
+    """ The cached entry if it was solved to optimality, otherwise None. """
+    entry = load(k)
+    return entry if entry is not None and entry["optimal"] else None
+
+def save(k: str, m: Model, status: OptimizationStatus,
+         disable_list: list, antidisable_list: list=None, **info) -> None:
+    """ Saves a solved model, its lists and any other information about the
+    solution, evicting old entries. """
+    os.makedirs(FOLDER, exist_ok=True)
+    m.write(path(k, MODEL))
+    if m.num_solutions > 0:
+        m.write(path(k, ".sol"))
+    # metadata is written last so a partial entry is never loaded
+    with open(path(k, ".json"), "w") as f:
+        json.dump({"optimal": status == OptimizationStatus.OPTIMAL,
+                   "objective": m.objective_value, "disable": disable_list,
+                   "antidisable": antidisable_list, **info}, f)
+    evict()
+
+def evict(limit: int=LIMIT) -> None:
+    """ Removes the least recently used entries until under limit bytes. """
+    if not os.path.isdir(FOLDER):
+        return
+    entries = {}
+    for fname in os.listdir(FOLDER):
+        k, ext = os.path.splitext(fname)
+        entries.setdefault(k, []).append(f"{FOLDER}/{fname}")
+    used = lambda k: os.path.getmtime(path(k, ".json")) \
+        if os.path.exists(path(k, ".json")) else 0
+    total = sum(os.path.getsize(f) for l in entries.values() for f in l)
+    for k in sorted(entries, key=used):
+        if total <= limit:
+            break
+        for fname in entries[k]:
+            total -= os.path.getsize(fname)
+            os.remove(fname)
+
+def clean() -> None:
+    """ Removes every entry. """
+    evict(0)
@@ -4,11 +4,21 @@ from .ilp import *
 DISABLE_SERIES = True
 
 if __name__ == "__main__":
-    m, x, y = model(antidisable=False, disable_series=DISABLE_SERIES,
-                    force_disable=False)
-    ### objective: maximize number of $wa characters
-    m.objective = xsum(w[i]*y[i] for i in range(M))
-
-    status = m.optimize()
-    display(antidisable=False, disable_series=DISABLE_SERIES)
+    from disablelist import cache
+    k = cache.key("char_ilp", DISABLE_SERIES=DISABLE_SERIES)
+    if (entry := cache.optimal(k)) is None:
+        m, x, y = model(antidisable=False, disable_series=DISABLE_SERIES,
+                        force_disable=False)
+        ### objective: maximize number of $wa characters
+        with timed("objective"):
+            m.objective = xsum(w[i]*y[i] for i in range(M))
 
+        warm_start(m, cache.path(k, ".sol") if cache.load(k) else
+                   WARM_START, antidisable=False,
+                   disable_series=DISABLE_SERIES)
+        status = solve(m)
+        print_timings()
+        print_gap(m)
+        cache.save(k, m, status, *solution(False, DISABLE_SERIES))
+        entry = cache.load(k)
+    report(entry["disable"], entry["antidisable"])
@@ -0,0 +1,71 @@
+from mip import OptimizationStatus
+from .ilp import *
+from problib.data import series_dict_wa
+### Dinkelbach's algorithm for the expected value ratio
+"""
+the expected value N(x)/D(x) is maximized by solving the linear problems
+max N(x) - l D(x) with l the ratio of the previous solution, which stops
+increasing exactly when no solution has a larger ratio:
+https://en.wikipedia.org/wiki/Fractional_programming#Dinkelbach's_algorithm
+no linearization bounds are needed, so every bundle can be considered
+"""
+DISABLE_SERIES, ANTIDISABLE = False, True  # whether to [anti]disable series
+EPSILON = 10**-9 # relative tolerance on N(x) - l D(x)
+ITERS = 20       # maximum number of iterations
+TIME = 120       # time limit of each solve in seconds
+# list[int] mapping series index -> total kakera value
+t = [series_dict_wa[series][1] for series in series_list]
+
+def ratio(y: list, z: list=None) -> tuple:
+    """ Numerator and denominator of the expected value of a solution. """
+    kept = [1 - round(y[i].x) + (round(z[i].x) if z is not None else 0)
+            for i in range(M)]
+    return sum(t[i]*kept[i] for i in range(M)), \
+        sum(w[i]*kept[i] for i in range(M))
+
+def dinkelbach(m: Model, y: list, z: list=None, eps: float=EPSILON,
+               iters: int=ITERS, verbose: bool=True) -> tuple:
+    """ Maximizes the expected value, starting from keeping every series.
+    Any solution with N - lD > 0 has a larger ratio, so the value still
+    increases every iteration if a solve stops early. Returns the ratio of
+    the final solution, which is the one left in m, and whether it's proven
+    optimal: converged with the last solve optimal. """
+    l = sum(t)/sum(w)
+    for k in range(iters):
+        m.objective = xsum((t[i] - l*w[i])*(1 - y[i] +
+                                            (z[i] if z is not None else 0))
+                           for i in range(M))
+        with timed(f"solve {k}"):
+            status = m.optimize(max_seconds=TIME)
+        n, d = ratio(y, z)
+        if verbose:
+            print(f"iteration {k}: l = {l:.6f}, N - lD = {n - l*d:.6f}")
+        if n - l*d <= eps*d:
+            return n/d, status == OptimizationStatus.OPTIMAL
+        l = n/d
+        # the previous solution is feasible, so warm start from it
+        m.start = [(v, v.x) for v in m.vars]
+    return n/d, False
+
+if __name__ == "__main__":
+    from disablelist import cache
+    k = cache.key("dinkelbach", DISABLE_SERIES=DISABLE_SERIES,
+                  ANTIDISABLE=ANTIDISABLE, EPSILON=EPSILON)
+    if (entry := cache.optimal(k)) is None:
+        result = model(antidisable=ANTIDISABLE, disable_series=DISABLE_SERIES)
+        m, y, z = result[0], result[2], result[3] if ANTIDISABLE else None
+        m.verbose = 0
+        warm_start(m, cache.path(k, ".sol") if cache.load(k) else
+                   WARM_START, ANTIDISABLE, DISABLE_SERIES)
+        value, optimal = dinkelbach(m, y, z)
+        print_timings()
+        # the gap of N - lD is relative to ~0 at convergence, so meaningless
+        print(f"ratio: {value:.6f} \
+({'optimal' if optimal else 'iteration or time limit reached'})")
+        status = OptimizationStatus.OPTIMAL if optimal else \
+            OptimizationStatus.FEASIBLE
+        cache.save(k, m, status, *solution(ANTIDISABLE, DISABLE_SERIES),
+                   value=value)
+        entry = cache.load(k)
+    print(f"expected value: {entry['value']:.3f}")
+    report(entry["disable"], entry["antidisable"])
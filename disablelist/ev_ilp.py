@@ -1,7 +1,10 @@
 import pickle, random, os
 from mip import Model, MAXIMIZE, CBC, BINARY, xsum
 from problib.data import *
+from problib.data import size, series_dict_wa, series_dict
 from problib.prob import E
+from disablelist.ilp import series_bundles, timed, print_timings, initial, \
+    solve, print_gap, report
 ### ILP optimized for expected value
 """
 technique described here: http://lpsolve.sourceforge.net/5.1/ratio.htm
@@ -11,11 +14,14 @@ https://optimization.mccormick.northwestern.edu/index.php/Mixed-integer_linear_f
 """
 NUM_BUNDLES = 30                           # reduce number of variables
 DISABLE_SERIES, ANTIDISABLE = False, True  # whether to [anti]disable series
+WARM_START = "lists"                       # see ilp.WARM_START
+SOLUTION = "ev_solution.sol"               # the last solution
 # number of bundles, number of series
 N, M = len(bundle_list), len(series_list)
-bundle_list.sort(key=lambda bundle: -size[bundle])
 NUM_BUNDLES = N = min(NUM_BUNDLES, N)
-bundle_list = bundle_list[:N]
+bundle_list = sorted(bundle_list, key=lambda bundle: -size[bundle])[:N]
+# bundle indices of each series
+I = series_bundles(bundle_list)
 # list[int] mapping bundle/series index -> total characters
 s = [size[bundle] for bundle in bundle_list] + \
     [series_dict[series][-1] for series in series_list]
@@ -25,92 +31,139 @@ w = [series_dict_wa[series][-1] for series in series_list]
 t = [series_dict_wa[series][1] for series in series_list]
 A = M if DISABLE_SERIES else 0
 
-### model and variables
-m = Model(sense=MAXIMIZE, solver_name=CBC)
-# lower and upper bounds on the denominator for Glover linearization 
+# lower and upper bounds on the denominator for Glover linearization
 # upper bound determined with linear programming
 L, U = 0, 0.0002
-# also double each list of variables, first are binary, second continuous 
-# whether the ith bundle/series is disabled
-x = [m.add_var(name=f"x{i}", var_type=BINARY) for i in range(N + A)]
-# whether the ith series is included or not
-y = [[m.add_var(name=f"y{i}", var_type=BINARY) for i in range(M)],
-     [m.add_var(name=f"yp{i}", lb=L, ub=U) for i in range(M)]]
-# whether the ith series is antidisabled or not
-z = [[m.add_var(name=f"z{i}", var_type=BINARY) for i in range(M)],
-     [m.add_var(name=f"zp{i}", lb=L, ub=U) for i in range(M)]]
-# denominator for the Charnes-Cooper transformation
-d = m.add_var(name="denominator", lb=L, ub=U)
 
-### constraints
-# can only disable up to K = 10 bundles, exactly K is faster but less accurate
-# change to <= K if it gives a better solution
-m += xsum(x) == NUM_DISABLE, "number_disable"
-# total sum of bundle sizes less than C = 20,000
-m += xsum(s[i]*x[i] for i in range(len(x))) <= OVERLAP, "capacity_limit"
-# can only antidisable up to A = 500 series
-m += xsum(z[0]) <= NUM_ANTIDISABLE, "number_antidisable"
-for i in range(M):
-    yi, name = y[0][i], series_list[i]
-    bundles = [x[j] for j in range(N) if name in bundle_dict[bundle_list[j]]]
-    if DISABLE_SERIES:
-        # the psuedo-bundle containing just the series
-        bundles.append(x[i + N])
-    if len(bundles) == 0:
-        # if no bundles have it, can't disable
-        m += yi == 0
-        continue
-    # if yi is included, at least one bundle needs to have it
-    m += xsum(bundles) >= yi, f"inclusion{i}"
-    # forcing term, comment out if the objective incentivizes forcing
-    m += xsum(bundles) <= len(bundles)*yi, f"forcing{i}"
-    # shouldn't antidisable a series if it isn't disabled
-    m += z[0][i] <= y[0][i], f"antidisable{i}"
+def model() -> tuple:
+    """ Generates the model, only on a cache miss. """
+    ### model and variables
+    with timed("variables"):
+        m = Model(sense=MAXIMIZE, solver_name=CBC)
+        global x, y, z, d
+        # also double each list of variables, first binary, second continuous
+        # whether the ith bundle/series is disabled
+        x = [m.add_var(name=f"x{i}", var_type=BINARY) for i in range(N + A)]
+        # whether the ith series is included or not
+        y = [[m.add_var(name=f"y{i}", var_type=BINARY) for i in range(M)],
+             [m.add_var(name=f"yp{i}", lb=L, ub=U) for i in range(M)]]
+        # whether the ith series is antidisabled or not
+        z = [[m.add_var(name=f"z{i}", var_type=BINARY) for i in range(M)],
+             [m.add_var(name=f"zp{i}", lb=L, ub=U) for i in range(M)]]
+        # denominator for the Charnes-Cooper transformation
+        d = m.add_var(name="denominator", lb=L, ub=U)
 
-# Glover linearization constraints in order to force
-# the continuous variables to act like a product 
-for k, var_list in enumerate([y, z]):
-    for i in range(len(var_list[0])):
-        xi, zi = var_list[0][i], var_list[1][i]
-        # m += L*xi <= zi, f"x{k}{i}_0l"
-        m += zi <= U*xi, f"x{k}{i}_0r"
-        m += d - U*(1 - xi) <= zi, f"x{k}{i}_1l"
-        m += zi <= d - L*(1 - xi), f"x{k}{i}_1r"
+    ### constraints
+    with timed("constraints"):
+        # can only disable up to K = 10 bundles, exactly K is faster but less
+        # accurate, change to <= K if it gives a better solution
+        m += xsum(x) == NUM_DISABLE, "number_disable"
+        # total sum of bundle sizes less than C = 20,000
+        m += xsum(s[i]*x[i] for i in range(len(x))) <= OVERLAP, "capacity_limit"
+        # can only antidisable up to A = 500 series
+        m += xsum(z[0]) <= NUM_ANTIDISABLE, "number_antidisable"
+        for i in range(M):
+            yi, bundles = y[0][i], [x[j] for j in I[i]]
+            if DISABLE_SERIES:
+                # the psuedo-bundle containing just the series
+                bundles.append(x[i + N])
+            if len(bundles) == 0:
+                # if no bundles have it, can't disable
+                m += yi == 0
+                continue
+            # if yi is included, at least one bundle needs to have it
+            m += xsum(bundles) >= yi, f"inclusion{i}"
+            # forcing term, comment out if the objective incentivizes forcing
+            m += xsum(bundles) <= len(bundles)*yi, f"forcing{i}"
+            # shouldn't antidisable a series if it isn't disabled
+            m += z[0][i] <= y[0][i], f"antidisable{i}"
 
-# denominator of the expected value
-m += xsum(w[i]*(d - (y[1][i] - z[1][i])) for i in range(M)) == 1, "denominator"
+        # Glover linearization constraints in order to force
+        # the continuous variables to act like a product 
+        for k, var_list in enumerate([y, z]):
+            for i in range(len(var_list[0])):
+                xi, zi = var_list[0][i], var_list[1][i]
+                # m += L*xi <= zi, f"x{k}{i}_0l"
+                m += zi <= U*xi, f"x{k}{i}_0r"
+                m += d - U*(1 - xi) <= zi, f"x{k}{i}_1l"
+                m += zi <= d - L*(1 - xi), f"x{k}{i}_1r"
 
-# if not antidisabling, turn each antidisable off 
-if not ANTIDISABLE:
-    for i in range(len(z[0])):
-        m += z[0][i] == 0, f"{zi.name}0"
-        m += z[1][i] == 0, f"{zi.name}1"
+        # denominator of the expected value
+        m += xsum(w[i]*(d - (y[1][i] - z[1][i])) for i in range(M)) == 1, \
+            "denominator"
 
-### objective: maximize expected value of the remaining characters
-# numerator of the expected value, denominator has been accounted for
-m.objective = xsum(t[i]*(d - (y[1][i] - z[1][i])) for i in range(M))
+        # if not antidisabling, turn each antidisable off 
+        if not ANTIDISABLE:
+            for i in range(len(z[0])):
+                m += z[0][i] == 0, f"{zi.name}0"
+                m += z[1][i] == 0, f"{zi.name}1"
 
-if __name__ == "__main__":
-    m.emphasis = 2   # emphasize optimality
-    m.preprocess = 1 # don't preprocess if it introduces error
-    status = m.optimize()
+    ### objective: maximize expected value of the remaining characters
+    with timed("objective"):
+        # numerator of the expected value, denominator has been accounted for
+        m.objective = xsum(t[i]*(d - (y[1][i] - z[1][i])) for i in range(M))
 
-    disable_list = [bundle_list[i] for i in range(N) if x[i].x >= 0.99] + \
-        [series_list[i - N] for i in range(N, N + A) if x[i].x >= 0.99]
-    antidisable_list = [series_list[i] for i in range(M) if z[0][i].x >= 0.99]
-    total = get_size(disable_list)
-    count, count_anti = get_wa(disable_list), get_wa(antidisable_list)
+    return m, x, y, z, d
 
-    X, p = random_variable(character_values(disable_list, antidisable_list))
-    print(f"expected value: {E(p, X):.3f}")
+def start(m: Model, disable_list: list, antidisable_list: list=[]) -> bool:
+    """ Warm starts from a configuration, see ilp.start. Only the N largest
+    bundles are in the model and it disables exactly NUM_DISABLE, so
+    returns whether what's left of the configuration is feasible. """
+    disabled, anti = set(disable_list), set(antidisable_list)
+    if len(disabled) > NUM_DISABLE or get_size(disable_list) > OVERLAP or \
+       len(anti) > NUM_ANTIDISABLE:
+        print("warm start exceeds the limits")
+        return False
+    if len(dropped := disabled - set(bundle_list + series_list[:A])) > 0:
+        print(f"warm start drops {', '.join(sorted(dropped))}, not in the \
+model")
+        disabled -= dropped
+    if len(disabled) != NUM_DISABLE:
+        print(f"warm start disables {len(disabled)}, the model disables \
+exactly {NUM_DISABLE}")
+        return False
+    values = {x[j]: float(bundle_list[j] in disabled) for j in range(N)}
+    values.update((x[N + i], float(series_list[i] in disabled))
+                  for i in range(A))
+    yv = [float(any(values[x[j]] for j in I[i]) or
+                (DISABLE_SERIES and values[x[N + i]])) for i in range(M)]
+    zv = [float(series_list[i] in anti and yv[i]) for i in range(M)]
+    # the continuous variables are the binary ones times the denominator
+    values[d] = dv = 1/sum(w[i]*(1 - yv[i] + zv[i]) for i in range(M))
+    for i in range(M):
+        values[y[0][i]], values[y[1][i]] = yv[i], dv*yv[i]
+        values[z[0][i]], values[z[1][i]] = zv[i], dv*zv[i]
+    m.start = list(values.items())
+    return True
 
-    print(f"disablelist ({len(disable_list)}/{NUM_DISABLE})")
-    print(f"{server_disabled + total} disabled ({server_wa + count} $wa)")
-    print(f"Overlap limit: {total} / {OVERLAP} characters")
-    print(f"{count} $wa characters disabled by $disable")
-    print(f"$disable {' $'.join(disable_list)}")
+if __name__ == "__main__":
+    from disablelist import cache
+    k = cache.key("ev_ilp", NUM_BUNDLES=NUM_BUNDLES,
+                  DISABLE_SERIES=DISABLE_SERIES, ANTIDISABLE=ANTIDISABLE,
+                  L=L, U=U)
+    if (entry := cache.optimal(k)) is None:
+        m, x, y, z, d = model()
+        m.emphasis = 2   # emphasize optimality
+        m.preprocess = 1 # don't preprocess if it introduces error
+        # a cached solution that isn't optimal is still a good start
+        source = cache.path(k, ".sol") if cache.load(k) else WARM_START
+        if source is not None and source.endswith(".sol"):
+            if os.path.exists(source):
+                m.read(source)
+        elif source is not None and not start(m, *initial(source)):
+            print(f"warm start from {source} is infeasible, ignoring")
+        status = solve(m, SOLUTION)
+        print_timings()
+        print_gap(m)
 
-    print(f"antidisablelist ({len(antidisable_list)}/{NUM_ANTIDISABLE})")
-    print(f"{count_anti} antidisabled characters")
-    print(f"$antidisable {' $'.join(antidisable_list)}")
+        disable_list = [bundle_list[i] for i in range(N) if x[i].x >= 0.99] + \
+            [series_list[i - N] for i in range(N, N + A) if x[i].x >= 0.99]
+        antidisable_list = [series_list[i] for i in range(M)
+                            if z[0][i].x >= 0.99]
+        cache.save(k, m, status, disable_list, antidisable_list)
+        entry = cache.load(k)
+    disable_list, antidisable_list = entry["disable"], entry["antidisable"]
 
+    X, p = random_variable(character_values(disable_list, antidisable_list))
+    print(f"expected value: {E(p, X):.3f}")
+    report(disable_list, antidisable_list)
@@ -0,0 +1,21 @@
+import time
+import numpy as np
+from problib.data import series_list
+from problib.incremental import Evaluator
+### exact per-series weights for the ILP's objective
+"""
+instead of regressing on random configurations like linreg.py, the weight
+of a series is the exact change in expected value from disabling it in the
+current configuration, every series evaluated in one vectorized batch
+"""
+FNAME_COEF = "gradient_coef" # set ilp.COEF to use these coefficients
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    evaluator = Evaluator()
+    coef = evaluator.gradient(series_list)
+    print(f"expected value: {evaluator.value():.3f}")
+    print(f"{len(coef)} series in {time.perf_counter() - start:.3f}s")
+    for i in np.argsort(coef)[::-1][:5]:
+        print(f"disabling {series_list[i]}: {coef[i]:+.6f}")
+    np.save(FNAME_COEF, coef)
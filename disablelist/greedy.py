@@ -1,34 +1,48 @@
-import pickle, random, math
+import heapq
+import numpy as np
 from problib.data import *
 # the max cover problem, with an additional constraint and weighting
 # greedy algorithm on the traditional problem yields a bound of (1 - 1/e):
 # https://people.seas.harvard.edu/~yaron/AM221-S16/lecture_notes/AM221_lecture18.pdf
+# coverage is submodular so gains only shrink, lazy evaluation (CELF):
+# https://www.cs.cmu.edu/~jure/pubs/detect-kdd07.pdf
 
-K = 10 # number of sets able to be added
-def greedy() -> list:
-    """ At each iteration, adds the set which removes the most number. """
-    l, seen, count, total = [], set(), 0, 0
-    for i in range(K):
-        best, add, name, disable_wa, disable = -float("inf"), None, "", 0, 0
-        for bundle, series in bundle_dict.items():
-            added = set(s for s in series if s not in seen)
-            num = size[bundle]
-            wa = sum(series_dict_wa[s][-1] for s in added)
-            # k = wa
-            k = wa + math.exp(disable/20000 - 1)*(-num)*0.75 if num > 0 else 0
-            # if total + num > 20000:
-            #     continue
-            if k > best:
-                best, add, name, disable_wa, disable = k, added, bundle, wa, num
-        count += disable_wa
-        total += disable
-        seen |= add
-        l.append(name)
+# number of sets able to be added and the overlap limit, 50 and 25000 premium
+K, CAPACITY = NUM_DISABLE, OVERLAP
+
+def members() -> list:
+    """ Series indices of each bundle. """
+    return np.split(bundle_series, bundle_ptr[1:-1])
+
+def greedy(K: int=K, capacity: int=CAPACITY, ratio: bool=False) -> tuple:
+    """ At each iteration, adds the set which removes the most $wa characters
+    (per character disabled if ratio) while staying within capacity. """
+    sets, cost = members(), size_array
+    covered = np.zeros(len(series_names), bool)
+    gain = lambda j: int(wa_array[sets[j][~covered[sets[j]]]].sum())
+    key = lambda j, g: g/cost[j] if ratio and cost[j] > 0 else g
+    # max heap of possibly stale gains and the iteration they're from
+    heap = [(-key(j, gain(j)), j, 0) for j in range(len(sets))]
+    heapq.heapify(heap)
+    l, count, total = [], 0, 0
+    while len(l) < K and heap:
+        _, j, i = heapq.heappop(heap)
+        # capacity only decreases, so a set that doesn't fit never will
+        if total + cost[j] > capacity:
+            continue
+        if i < len(l):
+            # stale gain, reevaluate and reinsert
+            heapq.heappush(heap, (-key(j, gain(j)), j, len(l)))
+            continue
+        count += gain(j)
+        total += int(cost[j])
+        covered[sets[j]] = True
+        l.append(bundle_list[j])
     return l, count, total
 
 if __name__ == "__main__":
-    disable_list, count, total = greedy()
+    disable_list, count, total = max(greedy(), greedy(ratio=True),
+                                     key=lambda result: result[1])
     print(f"Disabled by server: $wa characters {server_wa} and {server_disabled} total")
     print(f"Disabling {count} $wa characters and {total} characters total")
     print(f"$disable {' $'.join(disable_list)}")
-
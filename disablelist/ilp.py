@@ -1,9 +1,15 @@
-import pickle, random, os
+import pickle, random, os, time
+from contextlib import contextmanager
 import numpy as np
 from mip import Model, MAXIMIZE, MINIMIZE, CBC, BINARY, xsum
 from problib.data import *
+from problib.data import bundle_dict, size, series_dict_wa, series_dict
 ### general ILP giving the structure of the problem
 
+WARM_START = "lists"       # "greedy", "lists", a .sol file or None
+SOLUTION = "solution.sol"  # the last solution, to warm start the next run
+COEF = "linreg_coef.npy"   # objective weights, from linreg.py or gradient.py
+
 # number of bundles, number of series
 N, M = len(bundle_list), len(series_list)
 # list[int] mapping bundle/series index -> total characters
@@ -12,23 +18,78 @@ s = [size[bundle] for bundle in bundle_list] + \
 # list[int] mapping series index -> $wa characters
 w = [series_dict_wa[series][-1] for series in series_list]
 
+def series_bundles(bundles: list=bundle_list) -> list:
+    """ Inverted index mapping each series index to the indices of the
+    bundles in bundles containing it, linear in the number of memberships. """
+    index, rtn = {name: i for i, name in enumerate(series_list)}, \
+        [[] for _ in series_list]
+    for j, bundle in enumerate(bundles):
+        for name in bundle_dict[bundle]:
+            rtn[index[name]].append(j)
+    return rtn
+
+# bundle indices of each series
+I = series_bundles()
+
+def series_groups() -> list:
+    """ Groups series indices by the set of bundles containing them. """
+    groups = {}
+    for i in range(M):
+        groups.setdefault(tuple(I[i]), []).append(i)
+    return list(groups.values())
+
+timings = {} # seconds spent in each phase of the last build and solve
+
+@contextmanager
+def timed(phase: str):
+    """ Records the time spent in a phase of building or solving. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - start
+
+def print_timings() -> None:
+    """ Prints the time spent in each phase. """
+    print(", ".join(f"{phase} {t:.3f}s" for phase, t in timings.items()))
+
 def model(antidisable: bool=True, disable_series: bool=True,
           force_disable: bool=True) -> tuple:
     """ Generates a model. """
     ### model and variables
     m = Model(sense=MAXIMIZE, solver_name=CBC)
-    global x, y
+    global x, y, groups
     A = M if disable_series else 0
-    # whether the ith bundle/series is disabled
-    x = [m.add_var(name=f"x{i}", var_type=BINARY) for i in range(N + A)]
-    # whether the ith series is included or not
-    y = [m.add_var(name=f"y{i}", var_type=BINARY) for i in range(M)]
-    if antidisable:
-        global z
-        # whether the ith series is antidisabled or not
-        z = [m.add_var(name=f"z{i}", var_type=BINARY) for i in range(M)]
+    # series in exactly the same bundles are always disabled together if
+    # they can't be disabled on their own, so they share one variable
+    groups = series_groups() if force_disable and not disable_series else \
+        [[i] for i in range(M)]
+    with timed("variables"):
+        # whether the ith bundle/series is disabled
+        x = [m.add_var(name=f"x{i}", var_type=BINARY) for i in range(N + A)]
+        # whether the ith series is included or not, the variable of its
+        # group so objectives over y sum the coefficients of a group
+        y = [None]*M
+        for g, group in enumerate(groups):
+            yg = m.add_var(name=f"y{g}", var_type=BINARY)
+            for i in group:
+                y[i] = yg
+        if antidisable:
+            global z
+            # whether the ith series is antidisabled or not
+            z = [m.add_var(name=f"z{i}", var_type=BINARY) for i in range(M)]
 
     ### constraints
+    with timed("constraints"):
+        constraints(m, antidisable, disable_series, force_disable)
+
+    m.emphasis = 2 # emphasize optimality
+
+    return (m, x, y, z) if antidisable else (m, x, y)
+
+def constraints(m: Model, antidisable: bool, disable_series: bool,
+                force_disable: bool) -> None:
+    """ Adds the constraints of the problem to the model. """
     # can only disable up to K = 10 bundles, exactly K is faster but inaccurate
     # change to == K if it doesn't affect the solution and is faster
     m += xsum(x) <= NUM_DISABLE, "number_disable"
@@ -37,32 +98,80 @@ def model(antidisable: bool=True, disable_series: bool=True,
     if antidisable:
         # can only antidisable up to A = 500 series
         m += xsum(z) <= NUM_ANTIDISABLE, "number_antidisable"
-    for i in range(M):
-        yi, name = y[i], series_list[i]
-        bundles = [x[j] for j in range(N)
-                   if name in bundle_dict[bundle_list[j]]]
+    for g, group in enumerate(groups):
+        i = group[0]
+        yi, bundles = y[i], [x[j] for j in I[i]]
         if disable_series:
             # the psuedo-bundle containing just the series
             bundles.append(x[i + N])
         # if yi is included, at least one bundle needs to have it
-        m += xsum(bundles) >= yi, f"inclusion{i}"
+        m += xsum(bundles) >= yi, f"inclusion{g}"
         # forcing term, comment out if the objective incentivizes forcing
         if force_disable:
-            m += xsum(bundles) <= len(bundles)*yi, f"forcing{i}"
-        # shouldn't antidisable a series if it isn't disabled
+            m += xsum(bundles) <= len(bundles)*yi, f"forcing{g}"
+    # shouldn't antidisable a series if it isn't disabled
+    if antidisable:
+        for i in range(M):
+            m += z[i] <= y[i], f"antidisable{i}"
+
+def initial(source: str=WARM_START) -> tuple:
+    """ Disable and antidisable lists to warm start from. """
+    if source == "greedy":
+        from disablelist.greedy import greedy
+        return greedy()[0], []
+    if source == "lists":
+        return get_list(DISABLE_LIST), get_list(ANTIDISABLE_LIST)
+    return [], []
+
+def start(m: Model, disable_list: list, antidisable_list: list=[],
+          antidisable: bool=True, disable_series: bool=True) -> bool:
+    """ Warm starts the last model built from a configuration, returning
+    whether it satisfies the limits. """
+    disabled, anti = set(disable_list), set(antidisable_list)
+    if len(disabled) > NUM_DISABLE or get_size(disable_list) > OVERLAP or \
+       len(anti) > NUM_ANTIDISABLE:
+        return False
+    A = M if disable_series else 0
+    values = {x[j]: float(bundle_list[j] in disabled) for j in range(N)}
+    values.update((x[N + i], float(series_list[i] in disabled))
+                  for i in range(A))
+    for i in range(M):
+        values[y[i]] = float(any(values[x[j]] for j in I[i]) or
+                             (disable_series and values[x[N + i]]))
         if antidisable:
-            m += z[i] <= yi, f"antidisable{i}"
+            values[z[i]] = float(series_list[i] in anti and values[y[i]])
+    m.start = list(values.items())
+    return True
 
-    m.emphasis = 2 # emphasize optimality
+def warm_start(m: Model, source: str=WARM_START, antidisable: bool=True,
+               disable_series: bool=True) -> None:
+    """ Warm starts from greedy, the list files or a previous solution. """
+    if source is None:
+        return
+    if source.endswith(".sol"):
+        if os.path.exists(source):
+            m.read(source)
+    elif not start(m, *initial(source), antidisable, disable_series):
+        print(f"warm start from {source} exceeds the limits, ignoring")
 
-    return (m, x, y, z) if antidisable else (m, x, y)
+def solve(m: Model, fname: str=SOLUTION, max_seconds: float=float("inf"),
+          **kwargs):
+    """ Optimizes from the warm start in m.start, if any, in a single search
+    so preprocessing and the root LP are only done once. The solution is
+    written to fname. CBC's log shows when the first incumbent was found,
+    timing it here needs the progress log, which crashes CBC. """
+    with timed("solve"):
+        status = m.optimize(max_seconds=max_seconds, **kwargs)
+    if m.num_solutions > 0:
+        m.write(fname)
+    return status
 
-def display(antidisable: bool=True, disable_series: bool=True):
-    """ Displays the result of the optimization. """
-    tol = 0.99
-    A = M if disable_series else 0
-    disable_list = [bundle_list[i] for i in range(N) if x[i].x >= tol] + \
-        [series_list[i - N] for i in range(N, N + A) if x[i].x >= tol]
+def print_gap(m: Model) -> None:
+    """ Prints the relative gap between the solution and the bound. """
+    print(f"gap: {m.gap:.4%} ({m.objective_value} <= {m.objective_bound})")
+
+def report(disable_list: list, antidisable_list: list=None) -> None:
+    """ Prints a disable list and an antidisable list in Mudae's format. """
     total, count = get_size(disable_list), get_wa(disable_list)
 
     print(f"disablelist ({len(disable_list)}/{NUM_DISABLE})")
@@ -71,18 +180,41 @@ def display(antidisable: bool=True, disable_series: bool=True):
     print(f"{count} $wa characters disabled by $disable")
     print(f"$disable {' $'.join(disable_list)}")
 
-    if antidisable:
-        antidisable_list = [series_list[i] for i in range(M) if z[i].x >= tol]
+    if antidisable_list is not None:
         count_anti = get_wa(antidisable_list)
         print(f"antidisablelist ({len(antidisable_list)}/{NUM_ANTIDISABLE})")
         print(f"{count_anti} antidisabled characters")
         print(f"$antidisable {' $'.join(antidisable_list)}")
 
-if __name__ == "__main__":
-    ### objective: load coefficients from numpy array 
-    coef = np.load("linreg_coef.npy")
-    m.objective = xsum(coef[i]*(y[i] - z[i]) for i in range(M))
+def solution(antidisable: bool=True, disable_series: bool=True) -> tuple:
+    """ The disable list and antidisable list of the last model solved. """
+    tol = 0.99
+    A = M if disable_series else 0
+    disable_list = [bundle_list[i] for i in range(N) if x[i].x >= tol] + \
+        [series_list[i - N] for i in range(N, N + A) if x[i].x >= tol]
+    antidisable_list = [series_list[i] for i in range(M) if z[i].x >= tol] \
+        if antidisable else None
+    return disable_list, antidisable_list
 
-    status = m.optimize()
-    display()
+def display(antidisable: bool=True, disable_series: bool=True):
+    """ Displays the result of the optimization. """
+    report(*solution(antidisable, disable_series))
+
+if __name__ == "__main__":
+    from disablelist import cache
+    k = cache.key("ilp", [COEF])
+    if (entry := cache.optimal(k)) is None:
+        m, x, y, z = model()
+        ### objective: load coefficients from numpy array 
+        coef = np.load(COEF)
+        with timed("objective"):
+            m.objective = xsum(coef[i]*(y[i] - z[i]) for i in range(M))
 
+        # a cached solution that isn't optimal is still a good start
+        warm_start(m, cache.path(k, ".sol") if cache.load(k) else WARM_START)
+        status = solve(m)
+        print_timings()
+        print_gap(m)
+        cache.save(k, m, status, *solution())
+        entry = cache.load(k)
+    report(entry["disable"], entry["antidisable"])
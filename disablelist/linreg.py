@@ -1,78 +1,162 @@
-import random, os, pickle
+import json, os, time, warnings
+from multiprocessing import Pool
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from problib import data, prob, model
+from scipy import linalg
+from problib import cache, data, prob, model, incremental
 
-N = 10**4                               # number of rows in the dataset
-FNAMEX, FNAMEY = "linreg_X", "linreg_y" # names of the files
-FNAME_REG, FNAME_COEF = "linreg_model.pickle", "linreg_coef"
-
-random.seed(1)
-
-def sample_series(series: list) -> list:
-    """ Picks a random subset from the series to include. """
-    row, l = [], []
-    for s in series:
-        row.append(random.random() <= 0.5)
-        # because row represents whether a series is diasbled, add if 0
-        if row[-1] == 0:
-            l.append(s)
-    return row, l
+N, N_TEST = 10**4, 10**3          # number of rows in the dataset and test set
+CHUNK = 10**3                     # rows per chunk, the unit of resuming
+WORKERS = os.cpu_count()          # number of processes generating rows
+SEED, SEED_TEST = 1, 2            # different seeds for a different test set
+DATASET, TESTSET = "linreg", "linreg_test" # prefixes of the dataset files
+FNAME_COEF = "linreg_coef"        # coefficients used by the ILP
 
 def get_value(X: list, p: list) -> float:
     """ Gets the expected value of the rolls variable for the given r.v. """
-    D = {x: i for i, x in enumerate(X)}
-    F = prob.prefix_sum(p)
-    Fzs = [[pow(v, b) for v in F] for b in range(prob.B + 1)]
-    evzs = [prob.prefix_sum([X[i]*(Fzs[b][i + 1] - Fzs[b][i])
-            for i in range(len(X))]) for b in range(len(Fzs))]
-    p = model.prob
-    p.X, p.N, prob.D, p.F, p.Fzs, p.evzs = X, len(X), D, F, Fzs, evzs
-    m = model.Model()
+    m = model.Model(dist=prob.Distribution(X, p))
     return prob.E([m.p_k(x) for x in X], X)
 
-def dataset(n: int) -> tuple:
-    """ Generate a dataset. """
-    X, y = [], []
-    for i in range(n):
-        row, subset = sample_series(series)
-        rv, p = data.random_variable(data.char_values(subset))
-        yp = get_value(rv, p)
-        X.append(row)
-        y.append(yp)
+def incidence() -> tuple:
+    """ Support and series x value count matrix, rows in series_list order. """
+    _, X, H = incremental.incidence()
+    return X, H[:len(data.series_list)]
+
+def init() -> None:
+    """ Builds the incidence matrix once per worker. """
+    global support, H
+    support, H = incidence()
+
+def rows(task: tuple) -> tuple:
+    """ Generates a chunk of rows from its own seed. A row is whether each
+    series is disabled, packed into bits, and its value is get_value of the
+    remaining characters, computed for the whole chunk at once. """
+    c, n, seed = task
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(c,)))
+    row = rng.random((n, H.shape[0])) <= 0.5
+    counts = (H.T@(~row).T.astype(np.int64)).T
+    values = model.values(support, counts/counts.sum(axis=1, keepdims=True))
+    return c, np.packbits(row, axis=1), values
+
+def generate(name: str, n: int, seed: int, chunk: int=CHUNK,
+             workers: int=WORKERS) -> tuple:
+    """ Streams n rows into memory-mapped files, resuming from the chunks
+    already written. Returns the packed rows and their values. """
+    M, chunks = len(data.series_list), -(-n//chunk)
+    # resume only if the rows would come out the same: same source data,
+    # server disabled series and model parameters the values are taken under
+    meta = {"rows": n, "series": M, "chunk": chunk, "seed": seed,
+            "data": cache.digest(data.SOURCES), "source": data.DATA_SOURCE,
+            "server": data.server_disabled_list, "R": prob.R, "B": prob.B,
+            "ROLLS_AVAILABLE": model.ROLLS_AVAILABLE}
+    files = [f"{name}_{part}.npy" for part in ["X", "y", "done"]]
+    try:
+        with open(f"{name}.json") as f:
+            resume = json.load(f) == meta
+    except (OSError, ValueError):
+        resume = False
+    # the arrays may have been deleted out from under the metadata
+    mode = "r+" if resume and all(map(os.path.exists, files)) else "w+"
+    open_memmap = np.lib.format.open_memmap
+    X = open_memmap(files[0], mode, np.uint8, (n, -(-M//8)))
+    y = open_memmap(files[1], mode, np.float64, (n,))
+    done = open_memmap(files[2], mode, bool, (chunks,))
+    # the metadata is only valid once the files exist
+    with open(f"{name}.json", "w") as f:
+        json.dump(meta, f)
+
+    tasks = [(c, min(chunk, n - c*chunk), seed) for c in range(chunks)
+             if not done[c]]
+    if len(tasks) > 0:
+        print(f"Generating {n} rows ({len(tasks)}/{chunks} chunks left)...")
+    start, count = time.perf_counter(), 0
+    with Pool(workers, initializer=init) as pool:
+        for c, packed, values in pool.imap_unordered(rows, tasks):
+            X[c*chunk:c*chunk + len(values)] = packed
+            y[c*chunk:c*chunk + len(values)] = values
+            X.flush(); y.flush()
+            # chunk is only marked done after its rows are on disk
+            done[c] = True
+            done.flush()
+            count += len(values)
+            print(f"chunk {c}: {count/(time.perf_counter() - start):,.0f} rows/sec")
     return X, y
 
-series = data.series_list
-# load dataset from file
-if os.path.exists(f"{FNAMEX}.npy"):
-    print("Loading dataset from disk. ")
-    X, y = np.load(f"{FNAMEX}.npy"), np.load(f"{FNAMEY}.npy")
-# generate data
-else:
-    print(f"Generating {N} rows...")
-    X, y = dataset(N)
-    # save dataset for easier model prototyping
-    np.save(FNAMEX, X)
-    np.save(FNAMEY, y)
+def unpack(X: np.ndarray) -> np.ndarray:
+    """ Unpacks bit-packed rows into booleans. """
+    return np.unpackbits(X, axis=1, count=len(data.series_list)).astype(bool)
+
+def chunks(X: np.ndarray, y: np.ndarray, chunk: int=CHUNK):
+    """ Unpacked rows and values of a dataset, a chunk at a time. """
+    for i in range(0, len(y), chunk):
+        # counts are exact in float32 up to 2^24 rows per chunk
+        yield unpack(X[i:i + chunk]).astype(np.float32), \
+            np.asarray(y[i:i + chunk])
+
+def normal(X: np.ndarray, y: np.ndarray, chunk: int=CHUNK) -> tuple:
+    """ Centered normal equations G coef = b, the column means, the mean
+    value and the number of rows, accumulated a chunk at a time so memory
+    doesn't grow with the rows. """
+    M = len(data.series_list)
+    G, b, s, n, total = np.zeros((M, M)), np.zeros(M), np.zeros(M), 0, 0
+    for Xc, yc in chunks(X, y, chunk):
+        G += Xc.T@Xc
+        b += Xc.T@yc
+        s += Xc.sum(axis=0)
+        n, total = n + len(yc), total + yc.sum()
+    # centering the normal equations fits the intercept
+    mu, mean = s/n, total/n
+    G -= n*np.outer(mu, mu)
+    b -= n*mu*mean
+    return G, b, mu, mean, n
 
-# load model from file
-if os.path.exists(FNAME_REG):
-    print("Loading model from disk.")
-    with open(FNAME_REG, "rb") as f:
-        reg = pickle.load(f)
-# generate model
-else:
-    print("Generating linear regression model...")
-    reg = LinearRegression().fit(X, y)
-    with open(FNAME_REG, "wb") as f:
-        pickle.dump(reg, f)
+def fit(X: np.ndarray, y: np.ndarray, chunk: int=CHUNK) -> tuple:
+    """ Least squares coefficients and intercept from the normal equations,
+    the minimum norm solution if they're singular. """
+    if len(y) <= len(data.series_list):
+        # centered G has rank at most n - 1, so it's singular, but the rows
+        # take no more memory than G and solving on them keeps the precision
+        A, mean = unpack(X).astype(np.float64), np.mean(y)
+        mu = A.mean(axis=0)
+        A -= mu
+        # centering leaves a singular value within round-off of 0
+        coef = linalg.lstsq(A, np.asarray(y) - mean,
+                            cond=max(A.shape)*np.finfo(A.dtype).eps,
+                            overwrite_a=True, check_finite=False)[0]
+        return coef, mean - mu@coef
+    G, b, mu, mean, n = normal(X, y, chunk)
+    # solve warns instead of raising when G is nearly singular
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", linalg.LinAlgWarning)
+        try:
+            # G is too large to copy, solve factors it in place
+            coef = linalg.solve(G, b, assume_a="pos", overwrite_a=True,
+                                check_finite=False)
+            return coef, mean - mu@coef
+        except (linalg.LinAlgError, linalg.LinAlgWarning):
+            pass
+    # G was overwritten, accumulate it again and take its pseudoinverse,
+    # eigenvalues within round-off of 0 are the null space
+    G, b, mu, mean, n = normal(X, y, chunk)
+    w, V = linalg.eigh(G, overwrite_a=True, check_finite=False)
+    keep = w > len(w)*np.finfo(w.dtype).eps*w.max()
+    coef = V[:, keep]@((V[:, keep].T@b)/w[keep])
+    return coef, mean - mu@coef
 
-# set different seed to make the test set different
-random.seed(2)
-X_test, y_test = dataset(10**3)
-print(f"R^2 score on dataset: {reg.score(X, y)}")
-print(f"R^2 score on test: {reg.score(X_test, y_test)}")
-# use coefficients of the regression as weights in the ILP's objective
-# we don't care about the bias because that's a constant term
-np.save(FNAME_COEF, reg.coef_)
+def score(X: np.ndarray, y: np.ndarray, coef: np.ndarray,
+          intercept: float, chunk: int=CHUNK) -> float:
+    """ R^2 of the fit on a dataset, a chunk at a time. """
+    mean = np.mean(y)
+    sse = sum(np.sum((yc - Xc@coef - intercept)**2)
+              for Xc, yc in chunks(X, y, chunk))
+    return 1 - sse/np.sum((np.asarray(y) - mean)**2)
 
+if __name__ == "__main__":
+    X, y = generate(DATASET, N, SEED)
+    X_test, y_test = generate(TESTSET, N_TEST, SEED_TEST)
+    print("Fitting linear regression model...")
+    coef, intercept = fit(X, y)
+    print(f"R^2 score on dataset: {score(X, y, coef, intercept)}")
+    print(f"R^2 score on test: {score(X_test, y_test, coef, intercept)}")
+    # use coefficients of the regression as weights in the ILP's objective
+    # we don't care about the bias because that's a constant term
+    np.save(FNAME_COEF, coef)
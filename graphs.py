@@ -1,7 +1,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from problib.prob import *
-from problib import model, convolve, test_model
+from problib import model, convolve, parallel, exact
 
 ROLLS = True  # whether to include the $rolls model
 STEM  = False # whether to use a stem plot
@@ -25,7 +25,11 @@ def model_pmf(r: int=R, b: int=B,
     m = model.Model(r, b, ra, rc)
     return [m.p_k(x) for x in X]
 
-ev, var = lambda *args: E(model_pmf(*args)), lambda *args: Var(model_pmf(*args))
+ev = lambda *args: E(model_pmf(*args))
+# exact variance of the value claimed in a game, only $rolls needs a model
+var = lambda r=R, b=B, ra=model.ROLLS_AVAILABLE, rc=model.ROLLS_CYCLE: \
+    (exact.game(model.Model(r, b, ra, rc)) if ra else exact.play(r, b))[0] \
+    .Var()
 
 ### Graph 1: pmf of X
 g = 1
@@ -180,7 +184,9 @@ g = 11
 if graphs[g]:
     R, B = 300, 300
     grid = [[(r, b) for b in range(1, B + 1)] for r in range(1, R + 1)]
-    z = [[var(r, b, False) for r, b in row] for row in grid]
+    # batch sizes outermost so the Ef tables of each stay cached
+    z = np.array([[var(r, b, False) for r in range(1, R + 1)]
+                  for b in range(1, B + 1)]).T
     ax = fig.add_subplot(111, projection="3d")
     ax.plot_surface(*zip(*[zip(*row) for row in grid]), np.array(z),
                     cmap="viridis")
@@ -208,13 +214,9 @@ if graphs[g]:
 g = 13
 if graphs[g]:
     N = 10**4
-    import random
-    random.seed(7)
-    y = [0]
-    for i in range(N):
-        v = test_model.simulate(index=i)
-        y.append((y[-1]*i + v)/len(y))
-    plt.plot(range(1, N + 1), y[1:])
+    v = parallel.simulate(N, seed=7, values=True)[-1]
+    y = np.cumsum(v)/np.arange(1, N + 1)
+    plt.plot(range(1, N + 1), y)
     ev = model.Model().p_k.E()
     plt.plot(range(1, N + 1), [ev]*N)
     plt.title("Average Value over Games")
@@ -0,0 +1,94 @@
+import functools
+from multiprocessing import Pool
+import numpy as np
+from scipy import sparse
+from . import data, model
+from .incremental import CHUNK, incidence
+### expected value, size and $wa of many candidate lists at once
+"""
+a candidate is a 0/1 row over the bundles then the series (like the ILP's
+variables) and optionally a 0/1 row over the antidisabled series, and its
+histogram of character values is its enabled series times the sparse
+series x value incidence matrix
+"""
+WORKERS = 1 # processes evaluating chunks, os.cpu_count() for every core
+
+@functools.lru_cache(maxsize=None)
+def tables() -> tuple:
+    """ Sparse (bundles + series) x series membership matrix, the size of
+    each bundle and series, the $wa characters of each series and the
+    support and series x value counts, built once per process. """
+    data.load()
+    M = len(data.series_list)
+    B = sparse.vstack([data.bundle_matrix[:, :M], sparse.identity(M, bool)],
+                      format="csr").astype(np.int64)
+    # sizes as in get_size, series count their $wa characters
+    sizes = np.concatenate([data.size_array, data.wa_array[:M]])
+    _, X, H = incidence()
+    return B, sizes, data.wa_array[:M], X, H[:M]
+
+def candidates(disable_lists: list, antidisable_lists: list=None) -> tuple:
+    """ Candidate matrices from disable and antidisable lists. Names are
+    bundles if they're in bundle_dict and series otherwise, as get_size. """
+    data.load()
+    N = len(data.bundle_list)
+    index = {name: N + i for i, name in enumerate(data.series_list)}
+    index.update((b, j) for j, b in enumerate(data.bundle_list))
+    series = {s: i for i, s in enumerate(data.series_list)}
+    matrix = lambda lists, index, n: sparse.csr_matrix(
+        (np.ones(sum(map(len, lists)), np.int8),
+         np.array([index[name] for l in lists for name in l], np.int64),
+         np.cumsum([0] + [len(l) for l in lists])), shape=(len(lists), n))
+    return matrix(disable_lists, index, N + len(series)), \
+        None if antidisable_lists is None else \
+        matrix(antidisable_lists, series, len(series))
+
+def chunk_values(task: tuple) -> tuple:
+    """ Expected value, size and $wa of a chunk of candidates. """
+    C, A = task
+    B, sizes, wa, X, H = tables()
+    C = sparse.csr_matrix(C, dtype=np.int64)
+    # columns may be the bundles only
+    disabled = C@B[:C.shape[1]]
+    disabled.data[:] = 1
+    # antidisabling only matters for disabled series
+    off = disabled if A is None else \
+        disabled - disabled.multiply(sparse.csr_matrix(A) > 0)
+    counts = np.asarray(H.sum(axis=0)) - (off@H).toarray()
+    ev = model.values(X, counts/counts.sum(axis=1, keepdims=True))
+    return ev, C@sizes[:C.shape[1]], disabled@wa
+
+def evaluate(disable: sparse.spmatrix, antidisable: sparse.spmatrix=None,
+             chunk: int=CHUNK, workers: int=WORKERS) -> tuple:
+    """ Expected value, get_size and get_wa of every candidate, a row of
+    disable (bundles then series) and of antidisable (series) each. """
+    disable = sparse.csr_matrix(disable)
+    if antidisable is not None:
+        antidisable = sparse.csr_matrix(antidisable)
+    tasks = [(disable[j:j + chunk], None if antidisable is None else
+              antidisable[j:j + chunk])
+             for j in range(0, disable.shape[0], chunk)]
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(chunk_values, tasks)
+    else:
+        results = list(map(chunk_values, tasks))
+    return tuple(np.concatenate(l) for l in zip(*results)) if results else \
+        (np.empty(0), np.empty(0, np.int64), np.empty(0, np.int64))
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    # random lists of 50 bundles, 10000 candidates
+    data.load()
+    lists = [list(rng.choice(data.bundle_list, data.NUM_DISABLE, False))
+             for _ in range(10000)]
+    C, _ = candidates(lists)
+    tables()
+    start = time.perf_counter()
+    ev, size, wa = evaluate(C)
+    elapsed = time.perf_counter() - start
+    print(f"{len(ev)} candidates in {elapsed:.3f}s: \
+{len(ev)/elapsed:,.0f} candidates/sec")
+    best = int(np.argmax(ev))
+    print(f"best: {ev[best]:.3f} ({size[best]} disabled, {wa[best]} $wa)")
@@ -0,0 +1,95 @@
+import hashlib, json, os, shutil
+import numpy as np
+# compiled columnar form of the pickled data, memory-mapped on load and
+# used as is, see data.load
+"""
+names of bundles, then series, then characters are kept in one string table,
+bundle -> series and series -> character membership are CSR-style offsets
+into flat arrays of series ids and character values
+"""
+VERSION = 1          # bump when the layout changes
+FOLDER = "compiled"  # subfolder of the data folder holding the artifact
+SEP = "\0"           # separator between names in the string table
+
+def digest(sources: list) -> str:
+    """ Hash of the source files the artifact is compiled from. """
+    h = hashlib.sha256(f"{VERSION}".encode())
+    for fname in sources:
+        with open(fname, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def strings(names: list) -> tuple:
+    """ Returns a utf-8 string table and the offset of each name in it. """
+    encoded = [name.encode() for name in names]
+    offsets = np.cumsum([0] + [len(e) + len(SEP) for e in encoded])
+    return np.frombuffer(SEP.encode().join(encoded), np.uint8), offsets
+
+def columns(sources: list, bundle_dict: dict, size: dict,
+            series_dict_wa: dict, series_dict: dict, series_char: dict,
+            char_value: dict) -> dict:
+    """ Compiles the parsed dictionaries into columnar arrays. """
+    bundles, series = list(bundle_dict), list(series_dict_wa)
+    index = {s: i for i, s in enumerate(series)}
+    chars = [char for s in series for char in series_char[s]]
+    table, offsets = strings(bundles + series + chars)
+    return {
+        "version": VERSION, "hash": digest(sources),
+        "bundles": len(bundles), "series": len(series), "chars": len(chars),
+        "strings": table, "offsets": offsets,
+        "bundle_size": np.array([size[b] for b in bundles], np.int64),
+        "bundle_ptr": np.cumsum([0] + [len(bundle_dict[b]) for b in bundles]),
+        "bundle_series": np.array([index[s] for b in bundles
+                                   for s in bundle_dict[b]], np.int32),
+        "series_wa": np.array([series_dict_wa[s] for s in series],
+                              np.int64).reshape(-1, 3),
+        "series_size": np.array([series_dict[s][-1] for s in series],
+                                np.int64),
+        "series_ptr": np.cumsum([0] + [len(series_char[s]) for s in series]),
+        "char_value": np.array([char_value[c] for c in chars], np.int64),
+    }
+
+def write(path: str, compiled: dict) -> None:
+    """ Writes the compiled arrays to the artifact at path. """
+    folder = f"{path}/{FOLDER}"
+    os.makedirs(folder, exist_ok=True)
+    meta = {}
+    for name, value in compiled.items():
+        if isinstance(value, np.ndarray):
+            np.save(f"{folder}/{name}.npy", value)
+        else:
+            meta[name] = value
+    # metadata is written last so a partial build is never considered valid
+    with open(f"{folder}/meta.json", "w") as f:
+        json.dump(meta, f)
+
+def load(path: str, sources: list) -> dict:
+    """ Memory-maps the artifact at path, None if missing or stale. """
+    folder = f"{path}/{FOLDER}"
+    try:
+        with open(f"{folder}/meta.json") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != VERSION or meta.get("hash") != digest(sources):
+        return None
+    arrays = {name[:-4]: np.load(f"{folder}/{name}", mmap_mode="r")
+              for name in os.listdir(folder) if name.endswith(".npy")}
+    return {**meta, **arrays}
+
+def clean(path: str) -> None:
+    """ Removes the artifact at path. """
+    shutil.rmtree(f"{path}/{FOLDER}", ignore_errors=True)
+
+def names(compiled: dict) -> tuple:
+    """ Decodes the string table into bundle, series and character names. """
+    table = bytes(compiled["strings"]).decode().split(SEP)
+    nb, ns = compiled["bundles"], compiled["series"]
+    return table[:nb], table[nb:nb + ns], table[nb + ns:]
+
+if __name__ == "__main__":
+    # force a rebuild of the artifact for the configured data source
+    from . import data
+    clean(data.DATA)
+    write(data.DATA, data.compiled())
+    print(f"compiled {data.DATA}/{FOLDER}")
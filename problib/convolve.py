@@ -1,75 +1,55 @@
-import cmath, math
+import numpy as np
+from scipy import fft
 
-def rev_increment(c: int, m: int) -> int:
-    """ Increments a reverse binary counter. """
-    i = 1 << (m - 1)
-    while c & i > 0:
-        c ^= i
-        i >>= 1
-    return c ^ i
+DIRECT = 1 << 12 # below this many multiplications convolve directly
+EPS = 10**-13    # coefficients this small relative to the largest are round-off
 
-def bit_rev_copy(a: list) -> list:
-    """ Constructs an order from a by reversing the bits of the index. """
-    n, m = len(a), len(a).bit_length() - 1
-    A = [0]*n
-    c = 0
-    for i in range(n):
-        A[c] = a[i]
-        c = rev_increment(c, m)
-    return A
+def size(n: int) -> int:
+    """ Smallest length at least n that the real FFT handles quickly. """
+    return fft.next_fast_len(n, real=True)
 
-def iter_fft(a: list, inv: bool=False) -> list:
-    """ Computes the DFT iteratively. """
-    n = len(a)
-    A = bit_rev_copy(a)
-    for s in range(1, n.bit_length()):
-        m = 1 << s
-        wm = cmath.exp((-1 if inv else 1)*2*cmath.pi*1j/m)
-        for k in range(0, n, m):
-            w = 1
-            for j in range(m >> 1):
-                t = w*A[k + j + (m >> 1)]
-                u = A[k + j]
-                A[k + j] = u + t
-                A[k + j + (m >> 1)] = u - t
-                w *= wm
-    return A
-
-def inv_iter_fft(a: list) -> list:
-    """ Computes the inverse DFT of a. """
-    return [x/len(a) for x in iter_fft(a, True)]
-
-def mirror(a: list) -> list:
-    """ Pads a to make its length a power of 2. """
-    n, np = len(a), 1 << math.ceil(math.log2(len(a)))
-    a += [0]*(np - n)
+def clip(a: np.ndarray, eps: float=EPS) -> np.ndarray:
+    """ Zeroes the round-off left over by the inverse FFT, keeping every
+    coefficient that's really there, negative or not. """
+    a[np.abs(a) < eps*np.abs(a).max(initial=0)] = 0
     return a
 
-def poly_mult(a: list, b: list) -> list:
-    """ Multiplies two polynomials via the FFT. """
+def poly_mult(a: list, b: list) -> np.ndarray:
+    """ Multiplies two polynomials, directly or via the real FFT. """
+    a, b = np.asarray(a, np.float64), np.asarray(b, np.float64)
     m = len(a) + len(b) - 1
-    n = max(len(a), len(b))
-    # make both lists the same size and degree bound 2n instead of n
-    ap = mirror(a + [0]*(n - len(a)) + [0]*n)
-    bp = mirror(b + [0]*(n - len(b)) + [0]*n)
-    ap, bp = iter_fft(ap), iter_fft(bp)
-    return [x.real for x in inv_iter_fft([ap[i]*bp[i] for i in range(len(ap))])]
+    if len(a)*len(b) <= DIRECT or min(len(a), len(b)) <= 32:
+        return np.convolve(a, b)
+    n = size(m)
+    return clip(fft.irfft(fft.rfft(a, n)*fft.rfft(b, n), n)[:m])
 
-def poly_exp(p: list, k: int) -> list:
+def poly_exp(p: list, k: int) -> np.ndarray:
     """ Computes p^k, where p is a polynomial and k is an integer. """
-    rtn = [1]
+    p = np.asarray(p, np.float64)
+    m = k*(len(p) - 1) + 1
+    if m*len(p) <= DIRECT:
+        rtn = np.ones(1)
+        while k > 0:
+            # bit on in the binary representation of the exponent
+            if k & 1 == 1:
+                rtn = np.convolve(rtn, p)
+            k >>= 1
+            p = np.convolve(p, p) if k > 0 else p
+        return rtn
+    # every power of p fits in a transform of the final length, so square
+    # in the frequency domain, reusing the same two buffers at each step
+    n = size(m)
+    P, rtn = fft.rfft(p, n), np.ones(n//2 + 1, np.complex128)
     while k > 0:
-        # bit on in the binary representation of the exponent
         if k & 1 == 1:
-            rtn = poly_mult(rtn, p)
+            np.multiply(rtn, P, out=rtn)
         k >>= 1
-        p = poly_mult(p, p)
-    return rtn
+        if k > 0:
+            np.multiply(P, P, out=P)
+    return clip(fft.irfft(rtn, n, overwrite_x=True)[:m])
 
-def get_poly(X: list, p: list) -> list:
+def get_poly(X: list, p: list) -> np.ndarray:
     """ Gets the polynomial associated with the r.v. """
-    a = [0]*(max(X) + 1)
-    for i in range(len(X)):
-        a[X[i]] = p[i]
+    a = np.zeros(max(X) + 1)
+    a[np.asarray(X)] = p
     return a
-
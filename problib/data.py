@@ -1,10 +1,19 @@
 import pickle, os
-from problib import PATH
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cached_property
+import numpy as np
+from problib import PATH, cache
 
 DATA_SOURCE = 1  # 0 = initial data, 1 = complete data with character level
 OLD_LIST = False # whether to use the old server_diabled_list
 # path of the data folder relative to module path
 DATA = f"{PATH[0]}/data/{['old', 'complete'][DATA_SOURCE]}"
+OLD = f"{PATH[0]}/data/old"
+# files the compiled data depends on, see cache.py
+SOURCES = [f"{DATA}/bundle_info.p", f"{DATA}/wa_series_info.p",
+           [f"{DATA}/total_series_info.p", f"{OLD}/wa_series_info.p"]
+           [DATA_SOURCE]]
 
 # bundles and series can be disabled, only series can be antidisabled
 # limits on the number able to be disabled and antidisabled
@@ -18,11 +27,10 @@ def load_data(fname: str) -> dict:
     with open(f"{DATA}/{fname}.p", "rb") as f:
         return pickle.load(f)
 
-def parse_data(series_data: dict) -> tuple:
+def parse_data(series_data: dict, bundle_dict: dict) -> tuple:
     """ Parse Avik's format into multiple dictionaries. """
     # load old data
-    old = f"{PATH[0]}/data/old"
-    with open(f"{old}/wa_series_info.p", "rb") as f:
+    with open(f"{OLD}/wa_series_info.p", "rb") as f:
         old_series_wa = pickle.load(f)
 
     series_dict_wa, series_dict = {}, {}
@@ -56,11 +64,14 @@ def parse_data(series_data: dict) -> tuple:
 
 def parse_list(fname: str) -> list:
     """ Reads a text file in Mudae's list format. """
+    load()
     lines = []
     with open(fname) as f:
         for line in f:
             line = line.strip().lower()
-            if line in bundle_dict or line in series_dict:
+            # series disabled by the server come after series_list
+            if line in bundle_index or \
+                    series_index.get(line, len(series_list)) < len(series_list):
                 name = line
             else:
                 name, total = line.split()[:-1], line.split()[-1]
@@ -68,27 +79,124 @@ def parse_list(fname: str) -> list:
             lines.append(name)
     return lines
 
-# maps bundles -> List[str] of series
-bundle_dict = load_data("bundle_info")
-
-if DATA_SOURCE == 1:
-    size = {bundle: bundle_dict[bundle]["num_chars"] for bundle in bundle_dict}
-    bundle_dict = {b: info["series"] for b, info in bundle_dict.items()}
-    # for b in bundle_dict:
-    #     assert size[b] == sum(series_dict[s][-1] for s in bundle_dict[b])
-
-    # maps series -> Dict[total_kak, highest_kak, chars]
-    data = load_data("wa_series_info")
-    series_dict_wa, series_dict, series_char, char_value = parse_data(data)
-if DATA_SOURCE == 0:
-    # maps series -> Tuple(top_wa_kak, total_wa_kak, total_wa)
-    series_dict_wa = load_data("wa_series_info")
-    # maps series -> Tuple(top_kak, total_kak, total_char)
-    series_dict = load_data("total_series_info")
-    # compute sizes of each bundle
-    # number disabled is irrespective of overlap, counts it twice
-    size = {bundle: sum(series_dict[s][-1] for s in series)
-            for bundle, series in bundle_dict.items()}
+def compiled() -> dict:
+    """ Loads the compiled data, compiling it from the pickles if stale. """
+    arrays = cache.load(DATA, SOURCES)
+    if arrays is not None:
+        return arrays
+    # maps bundles -> List[str] of series
+    bundle_dict = load_data("bundle_info")
+    if DATA_SOURCE == 1:
+        size = {bundle: bundle_dict[bundle]["num_chars"]
+                for bundle in bundle_dict}
+        bundle_dict = {b: info["series"] for b, info in bundle_dict.items()}
+        # for b in bundle_dict:
+        #     assert size[b] == sum(series_dict[s][-1] for s in bundle_dict[b])
+
+        # maps series -> Dict[total_kak, highest_kak, chars]
+        parsed = parse_data(load_data("wa_series_info"), bundle_dict)
+    if DATA_SOURCE == 0:
+        # maps series -> Tuple(top_wa_kak, total_wa_kak, total_wa)
+        series_dict_wa = load_data("wa_series_info")
+        # maps series -> Tuple(top_kak, total_kak, total_char)
+        series_dict = load_data("total_series_info")
+        # compute sizes of each bundle
+        # number disabled is irrespective of overlap, counts it twice
+        size = {bundle: sum(series_dict[s][-1] for s in series)
+                for bundle, series in bundle_dict.items()}
+        parsed = series_dict_wa, series_dict, \
+            {s: [] for s in series_dict_wa}, {}
+    arrays = cache.columns(SOURCES, bundle_dict, size, *parsed)
+    try:
+        cache.write(DATA, arrays)
+    except OSError: # read-only install, compile again next time
+        pass
+    return arrays
+
+def load() -> None:
+    """ Loads the compiled arrays and names into the module on first use. """
+    global server_seen, server_wa, server_disabled, bundle_list, \
+        series_list, series_names, char_names, bundle_index, series_index, \
+        bundle_ptr, bundle_series, char_ptr, char_array, size_array, wa_array
+    if "series_list" in globals():
+        return
+    arrays = compiled()
+    bundle_list, series, chars = cache.names(arrays)
+    ptr, members = arrays["bundle_ptr"], arrays["bundle_series"]
+
+    # disable server bundles
+    server = np.zeros(len(series), bool)
+    for b in server_disabled_list:
+        i = bundle_list.index(b)
+        server[members[ptr[i]:ptr[i + 1]]] = True
+    server_seen = set(series[i] for i in np.flatnonzero(server))
+    server_wa = int(arrays["series_wa"][server, -1].sum())
+    server_disabled = int(arrays["series_size"][server].sum())
+
+    # series in series_list order followed by the server's, sorted by name
+    order = np.concatenate([np.flatnonzero(~server),
+                            sorted(np.flatnonzero(server),
+                                   key=series.__getitem__)]).astype(np.int64)
+    series_names = [series[i] for i in order]
+    series_list = series_names[:len(series) - len(server_seen)]
+    bundle_index = {b: i for i, b in enumerate(bundle_list)}
+    series_index = {s: i for i, s in enumerate(series_names)}
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    # bundles without the server's series, renumbered
+    keep = ~server[members]
+    bundle_ptr = np.concatenate(([0], np.cumsum(keep)))[ptr]
+    bundle_series = position[members[keep]]
+    # characters grouped by series in series_names order
+    counts = np.diff(arrays["series_ptr"])[order]
+    char_ptr = np.concatenate(([0], np.cumsum(counts)))
+    gather = np.repeat(arrays["series_ptr"][order] - char_ptr[:-1], counts) \
+        + np.arange(char_ptr[-1])
+    char_names = [chars[i] for i in gather.tolist()]
+    char_array = arrays["char_value"][gather]
+    size_array = np.asarray(arrays["bundle_size"])
+    # series disabled by the server have no $wa characters left to disable
+    wa_array = np.where(server, 0, arrays["series_wa"][:, -1])[order]
+
+def dicts() -> None:
+    """ Builds the name -> value dictionaries from the arrays, only needed
+    by callers working with names. """
+    global bundle_dict, size, series_dict_wa, series_dict, series_char, \
+        char_value
+    if "char_value" in globals():
+        return
+    load()
+    arrays, M = compiled(), len(series_list)
+    order = [series_index[s] for s in cache.names(arrays)[1]]
+    wa, n = arrays["series_wa"].tolist(), arrays["series_size"].tolist()
+    ptr, members = bundle_ptr.tolist(), bundle_series.tolist()
+    bundle_dict = {b: set(series_names[i] for i in members[ptr[j]:ptr[j + 1]])
+                   for j, b in enumerate(bundle_list)}
+    size = dict(zip(bundle_list, size_array.tolist()))
+    # compiled order, without the series disabled by the server
+    series_dict_wa = {series_names[i]: tuple(x)
+                      for i, x in zip(order, wa) if i < M}
+    series_dict = {series_names[i]: (x,) for i, x in zip(order, n) if i < M}
+    ptr = char_ptr.tolist()
+    series_char = {s: char_names[ptr[i]:ptr[i + 1]]
+                   for i, s in enumerate(series_names)}
+    char_value = dict(zip(char_names, char_array.tolist()))
+
+def matrices() -> None:
+    """ Wraps the membership arrays as sparse incidence matrices. """
+    global bundle_matrix, char_matrix
+    if "char_matrix" in globals():
+        return
+    # scipy is slow to import and only needed by the optimizers
+    from scipy import sparse
+    load()
+    # bundle x series and series x character incidence
+    bundle_matrix = sparse.csr_matrix(
+        (np.ones(len(bundle_series), bool), bundle_series, bundle_ptr),
+        shape=(len(bundle_list), len(series_names)))
+    char_matrix = sparse.csr_matrix(
+        (np.ones(len(char_array), bool), np.arange(len(char_array)),
+         char_ptr), shape=(len(series_names), len(char_array)))
 
 # disable server bundles
 server_disabled_list = ["western", "disturbing imagery"]
@@ -96,27 +204,47 @@ if OLD_LIST:
     # at some point in time we thought $toggledisturbing toggled horror genre 
     server_disabled_list = ["western", "disturbing imagery", "horror genre"]
 
-server_seen = set(x for b in server_disabled_list for x in bundle_dict[b])
-for bundle, series in bundle_dict.items():
-    bundle_dict[bundle] = set(s for s in series if s not in server_seen)
-server_wa = sum(series_dict_wa[s][-1] for s in server_seen)
-server_disabled = sum(series_dict[s][-1] for s in server_seen)
-for s in server_seen:
-    del series_dict[s]
-    del series_dict_wa[s]
+### integer-indexed sets
+"""
+series are numbered in series_list order followed by the series disabled by
+the server, characters grouped by series in that order, so a set of series or
+characters is a boolean mask and set algebra over names is an array op
+"""
+
+def series_mask(disable_list: list) -> np.ndarray:
+    """ Mask of the series covered by a list of bundles and series. """
+    load()
+    mask, unknown = np.zeros(len(series_names), bool), []
+    for b in disable_list:
+        if b in bundle_index:
+            i = bundle_index[b]
+            mask[bundle_series[bundle_ptr[i]:bundle_ptr[i + 1]]] = True
+        elif b in series_index:
+            mask[series_index[b]] = True
+        else:
+            unknown.append(b)
+    # a typo would otherwise quietly change the result
+    if len(unknown) > 0:
+        raise ValueError(f"unknown bundles or series: {', '.join(unknown)}")
+    return mask
 
-bundle_list, series_list = list(bundle_dict.keys()), list(series_dict_wa.keys())
+def char_mask(mask: np.ndarray) -> np.ndarray:
+    """ Mask of the characters in a mask of series. """
+    load()
+    return np.repeat(mask, np.diff(char_ptr))
 
 ### tie-in to prob
 
 def get_size(disable_list: list) -> int:
     """ Returns the total number of characters disabled. """
-    return sum(size[bundle] if bundle in size else series_dict_wa[bundle][-1]
-               for bundle in disable_list)
+    load()
+    bundles = [bundle_index[b] for b in disable_list if b in bundle_index]
+    series = [series_index[s] for s in disable_list if s not in bundle_index]
+    return int(size_array[bundles].sum() + wa_array[series].sum())
 
 def get_wa(disable_list: list) -> int:
     """ Returns the number of $wa characters in the disable_list. """
-    return sum(series_dict_wa[s][-1] for s in get_series(disable_list))
+    return int(wa_array[series_mask(disable_list)].sum())
 
 def get_list(fname: str) -> list:
     """ Reads a list from a file. """
@@ -125,19 +253,23 @@ def get_list(fname: str) -> list:
 def get_series(bundle_list: list) -> set:
     """ Gets the set of series associated with a bundle list. """
     # if a bundle is not in bundle_dict, it's a series and contains only itself
-    return set(series for b in bundle_list
-               for series in bundle_dict.get(b, [b]))
+    return {series_names[i] for i in np.flatnonzero(series_mask(bundle_list))}
 
 def char_values(series_list: list) -> list:
     """ Return the character values from a list of series. """
-    chars = set(char for s in series_list for char in series_char[s])
-    return [char_value[char] for char in chars]
+    load()
+    mask = np.zeros(len(series_names), bool)
+    mask[[series_index[s] for s in series_list]] = True
+    return char_array[char_mask(mask)].tolist()
 
 def character_values(disable_list: list=server_disabled_list,
                      anti_list: list=[]) -> list:
     """ Return the character values from a disable_list. """
-    seen = get_series(disable_list)
-    return char_values((set(series_list) - seen) | set(antidisable_list))
+    load()
+    enabled = ~series_mask(disable_list)
+    enabled[len(series_list):] = False
+    enabled[[series_index[s] for s in anti_list]] = True
+    return char_array[char_mask(enabled)].tolist()
 
 def random_variable(values: list) -> tuple:
     """ Returns the support set and the pmf of the kakera random variable. """
@@ -147,13 +279,110 @@ def random_variable(values: list) -> tuple:
     denom = sum(freq.values())
     return X, [freq[x]/denom for x in X]
 
-# read user-specific disable and antidisable lists from text files 
-disable_list = get_list(DISABLE_LIST)
-antidisable_list = get_list(ANTIDISABLE_LIST)
-assert len(disable_list) <= NUM_DISABLE, "too many to disable"
-assert get_size(disable_list) <= OVERLAP, "too many characters disabled"
-assert len(antidisable_list) <= NUM_ANTIDISABLE, "too many to antidisable"
+### datasets: a configuration of disable lists and its random variable
+
+class Dataset:
+
+    """ A disable and antidisable configuration, loaded on first use. """
+
+    def __init__(self, disable_list: list=None,
+                 antidisable_list: list=None) -> None:
+        # None reads the user-specific lists from the text files
+        self.disable, self.antidisable = disable_list, antidisable_list
+
+    @classmethod
+    def from_rv(cls, X: list, p: list) -> "Dataset":
+        """ A dataset with a given random variable instead of lists. """
+        dataset = cls([], [])
+        dataset.X, dataset.p = X, p
+        return dataset
+
+    @cached_property
+    def disable_list(self) -> list:
+        """ Bundles and series to disable. """
+        l = get_list(DISABLE_LIST) if self.disable is None else self.disable
+        assert len(l) <= NUM_DISABLE, "too many to disable"
+        assert get_size(l) <= OVERLAP, "too many characters disabled"
+        return l
+
+    @cached_property
+    def antidisable_list(self) -> list:
+        """ Series to antidisable. """
+        l = get_list(ANTIDISABLE_LIST) if self.antidisable is None \
+            else self.antidisable
+        assert len(l) <= NUM_ANTIDISABLE, "too many to antidisable"
+        return l
+
+    @cached_property
+    def rv(self) -> tuple:
+        """ Support set and pmf of the kakera random variable. """
+        assert DATA_SOURCE != 0, "initial data has no character values"
+        return random_variable(character_values(self.disable_list,
+                                                self.antidisable_list))
+
+    @cached_property
+    def X(self) -> list: return self.rv[0]
+    @cached_property
+    def p(self) -> list: return self.rv[1]
+
+    @cached_property
+    def dist(self):
+        """ Tables derived from the random variable, see prob.py. """
+        from .prob import Distribution
+        return Distribution(self.X, self.p)
+
+# dataset used by module level attributes, set per thread and async task
+current = ContextVar("current", default=None)
+default = None # the user's lists, used wherever no dataset is set
+
+def dataset() -> Dataset:
+    """ Returns the current dataset, the user's lists by default. """
+    global default
+    ds = current.get()
+    if ds is None:
+        if default is None:
+            default = Dataset()
+        ds = default
+    return ds
+
+@contextmanager
+def use(ds: Dataset):
+    """ Makes ds the current dataset inside a with block. Only the calling
+    thread or task sees it, others keep their own. """
+    token = current.set(ds)
+    try:
+        yield ds
+    finally:
+        current.reset(token)
+
+# names loaded by load(), dicts() and matrices() on first access, and names
+# forwarded to the current dataset
+ARRAYS = ["server_seen", "server_wa", "server_disabled", "bundle_list",
+          "series_list", "series_names", "char_names", "bundle_index",
+          "series_index", "bundle_ptr", "bundle_series", "char_ptr",
+          "char_array", "size_array", "wa_array"]
+DICTS = ["bundle_dict", "size", "series_dict_wa", "series_dict",
+         "series_char", "char_value"]
+MATRICES = ["bundle_matrix", "char_matrix"]
+CONTEXT = ["disable_list", "antidisable_list", "X", "p"]
 
-if DATA_SOURCE != 0:
-    X, p = random_variable(character_values(disable_list, antidisable_list))
+def __getattr__(name: str):
+    """ Loads data on first attribute access. """
+    for names, f in [(ARRAYS, load), (DICTS, dicts), (MATRICES, matrices)]:
+        if name in names:
+            f()
+            return globals()[name]
+    if name in CONTEXT:
+        return getattr(dataset(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
+# the lists and random variable depend on the dataset, so aren't exported,
+# and neither are the dicts and matrices, import them by name when needed
+__all__ = ["DATA_SOURCE", "OLD_LIST", "DATA", "NUM_DISABLE", "OVERLAP",
+           "NUM_ANTIDISABLE", "DISABLE_LIST", "ANTIDISABLE_LIST",
+           "load_data", "parse_data", "parse_list", "compiled", "load",
+           "dicts", "matrices",
+           "server_disabled_list", "get_size", "get_wa", "get_list",
+           "get_series", "series_mask", "char_mask", "char_values",
+           "character_values", "random_variable", "Dataset", "dataset",
+           "use"] + ARRAYS
@@ -0,0 +1,92 @@
+import numpy as np
+from . import prob, rv, model
+### exact distributions of a game played by a model
+"""
+the model only claims at the end of a batch, so a game is a chain of batch
+maxima: the j-th batch end is reached if every earlier batch max was at most
+Ef and claims its max if it's above, and the last batch can be extended by
+$rolls, assuming one is in stock whenever the model wants it, like p_k does.
+summing over the chain is O(batches x support), no simulation needed
+"""
+TOL = 10**-15                     # tail mass dropped from unbounded $rolls
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95] # quantiles reported by summary
+
+def game(m: model.Model, tol: float=TOL) -> tuple:
+    """ Random variables of the value claimed (0 if nothing is), the rolls
+    left before the claimed roll (0 if nothing is) and the number of $rolls
+    used in a game, the r of simulate and the counts of test_model. """
+    return play(m.R, m.B, m.dist, m.kp if m.ROLLS_AVAILABLE else None,
+                isinstance(m, model.GeneralModel), tol)
+
+def play(R: int=prob.R, B: int=prob.B, dist: prob.Distribution=None,
+         kp: float=None, general: bool=False, tol: float=TOL) -> tuple:
+    """ game without building a Model: $rolls is used on a final claim of
+    at most kp if given, again until the max is above kp if general. """
+    dist = prob.current() if dist is None else dist
+    X, F = rv.support(dist.X), np.asarray(dist.F, dtype=np.float64)
+    N, index = len(X), np.arange(len(X))
+    sizes = ([R % B] if R % B > 0 else []) + [B]*(R//B)
+    ends = R - np.cumsum(sizes)
+    # cmf and pmf of the max of each batch
+    Fz = F**np.array(sizes)[:, None]
+    fz = np.diff(Fz, axis=1)
+    # a batch is claimed if its max is above Ef of the rolls left after it
+    c = np.searchsorted(X, [dist.Ef(r, B) for r in ends], "right")
+    stay = Fz[np.arange(len(sizes)), c]
+    reach = np.concatenate(([1], np.cumprod(stay)))[:-1]
+    claim = index >= c[:, None]
+    value = (reach[:, None]*fz*claim).sum(axis=0)
+    roll = np.zeros(R + 1)
+    np.add.at(roll, ends + 1, reach*(1 - stay))
+    uses = np.ones(1)
+
+    if kp is not None and len(sizes) > 0:
+        # the last batch uses $rolls on a claim of at most k*
+        lo = np.searchsorted(X, kp, "right")
+        fb = reach[-1]*fz[-1]*(claim[-1] & (index < lo))
+        a = fb.sum()
+        value -= fb
+        FB = F**B
+        fB = np.diff(FB)
+        if general:
+            # $rolls is used again until the max is above k*, so the value
+            # is the first extension above k*, with n uses geometric
+            q = FB[lo]
+            value += a*fB*(index >= lo)/(1 - q)
+            n = 1 if q == 0 else max(int(np.ceil(np.log(tol)/np.log(q))), 1)
+            uses = np.concatenate(([1 - a], a*(1 - q)*q**np.arange(n)))
+            uses[-1] += a*q**n
+        else:
+            # the claim is the max of the batch and one extension
+            below = np.concatenate(([0], np.cumsum(fb)[:-1]))
+            value += fb*FB[1:] + below*fB
+            uses = np.array([1 - a, a])
+
+    # nothing is claimed if the last batch max is at most Ef(0)
+    roll[0] = unclaimed = np.prod(stay)
+    if unclaimed > 0:
+        i = np.searchsorted(X, 0)
+        if i == N or X[i] != 0:
+            X, value = np.insert(X, i, 0), np.insert(value, i, 0)
+        value[i] += unclaimed
+    return rv.RandomVariable.trusted(X, value, "value"), \
+        rv.RandomVariable.trusted(np.arange(R + 1), roll, "roll"), \
+        rv.RandomVariable.trusted(np.arange(len(uses)), uses, "$rolls")
+
+def summary(X: rv.RandomVariable, q: list=QUANTILES) -> dict:
+    """ Mean, variance and quantiles of a random variable. """
+    return {"mean": X.E(), "var": X.Var(),
+            **{f"q{x}": X.quantile(x) for x in q}}
+
+if __name__ == "__main__":
+    import time
+    for m in [model.Model(ROLLS_AVAILABLE=False), model.Model(),
+              model.GeneralModel()]:
+        start = time.perf_counter()
+        value, roll, uses = game(m)
+        elapsed = time.perf_counter() - start
+        print(f"{type(m).__name__} ($rolls: {m.ROLLS_AVAILABLE}), \
+{1000*elapsed:.3f}ms")
+        for X in [value, roll, uses]:
+            print(f"{X.name:>6}: " + ", ".join(f"{k} = {v:.3f}"
+                                               for k, v in summary(X).items()))
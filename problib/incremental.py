@@ -0,0 +1,141 @@
+import numpy as np
+from scipy import sparse
+from . import data, model, prob
+# expected value of a disable configuration, updated one series at a time
+"""
+every series is a row of kakera value counts over the support of all
+characters, so the histogram of a configuration is the sum of the rows of
+its enabled series and toggling a series adds or subtracts a single row
+"""
+
+CHUNK = 1 << 7 # neighbors per vectorized pass, small enough to stay in cache
+
+def incidence() -> tuple:
+    """ Series names, the support of every character value and the sparse
+    series x value matrix of character counts. """
+    data.load()
+    X = np.unique(data.char_array)
+    # one-hot character x value matrix
+    V = sparse.csr_matrix((np.ones(len(data.char_array), np.int64),
+                           np.searchsorted(X, data.char_array),
+                           np.arange(len(data.char_array) + 1)),
+                          shape=(len(data.char_array), len(X)))
+    return data.series_names, X, data.char_matrix.astype(np.int64)@V
+
+class Evaluator:
+
+    """ Model expected value of a disable configuration under updates. """
+
+    def __init__(self, disable_list: list=None, antidisable_list: list=None,
+                 R: int=prob.R, B: int=prob.B,
+                 ROLLS_AVAILABLE: bool=model.ROLLS_AVAILABLE) -> None:
+        self.R, self.B, self.ROLLS_AVAILABLE = R, B, ROLLS_AVAILABLE
+        self.series, self.X, self.H = incidence()
+        self.index = {s: i for i, s in enumerate(self.series)}
+        # series_list comes first, the server's series can't be toggled
+        self.M = len(data.series_list)
+        # enabled series, the same ones character_values keeps
+        ds = data.Dataset(disable_list, antidisable_list)
+        enabled = (set(data.series_list) - data.get_series(ds.disable_list)) \
+            | set(ds.antidisable_list)
+        self.on = np.zeros(len(self.series), bool)
+        self.on[[self.index[s] for s in enabled]] = True
+        self.counts = self.H.T@self.on.astype(np.int64)
+        self.__value = None
+        self.__cumulative = None
+
+    def __row(self, i: int) -> np.ndarray:
+        """ Dense character counts of the i-th series. """
+        return self.H[i].toarray()[0]
+
+    def __values(self, delta: sparse.spmatrix) -> np.ndarray:
+        """ Expected values after each row of changes to the counts. """
+        F = np.zeros((delta.shape[0], len(self.X) + 1))
+        np.cumsum(delta.toarray(), axis=1, out=F[:, 1:])
+        F[:, 1:] += np.cumsum(self.counts)
+        F /= F[:, -1:]
+        return model.values(self.X, F, self.R, self.B, self.ROLLS_AVAILABLE,
+                            is_cmf=True)
+
+    def update(self, series: str, on: bool) -> None:
+        """ Enables or disables a single series. """
+        i = self.index[series]
+        if self.on[i] != on:
+            self.on[i] = on
+            self.counts += self.__row(i) if on else -self.__row(i)
+            self.__value = None
+
+    def apply(self, i: np.ndarray, delta: np.ndarray) -> None:
+        """ Adds -1/0/1 changes delta to the enabled series with indices i. """
+        self.on[i[delta > 0]], self.on[i[delta < 0]] = True, False
+        self.counts += self.H[i].T@delta
+        self.__value = None
+
+    def toggle(self, series: str) -> None:
+        """ Flips whether a series is enabled. """
+        self.update(series, not self.on[self.index[series]])
+
+    def enabled(self, series: str) -> bool:
+        """ Whether a series is enabled. """
+        return bool(self.on[self.index[series]])
+
+    def value(self) -> float:
+        """ Expected value of the current configuration. """
+        if self.__value is None:
+            delta = sparse.csr_matrix((1, len(self.X)), dtype=np.int64)
+            self.__value = float(self.__values(delta)[0])
+        return self.__value
+
+    def neighbors(self, series: list=None, chunk: int=CHUNK) -> np.ndarray:
+        """ Expected value after toggling each series on its own, every
+        series in series_list by default. The configuration itself is
+        unchanged. """
+        i = np.arange(self.M) if series is None else \
+            np.array([self.index[s] for s in series], np.int64)
+        sign = np.where(self.on[i], -1, 1)
+        if self.__cumulative is None:
+            # a toggle adds or subtracts a whole row of the cmf's counts
+            self.__cumulative = np.cumsum(self.H.toarray(), axis=1,
+                                          dtype=np.int32)
+        base = np.concatenate(([0], np.cumsum(self.counts)))
+        ev = np.empty(len(i))
+        for j in range(0, len(i), chunk):
+            k = slice(j, j + chunk)
+            F = np.empty((len(i[k]), len(self.X) + 1))
+            F[:, 0] = 0
+            np.multiply(self.__cumulative[i[k]], sign[k, None], out=F[:, 1:])
+            F += base
+            F /= F[:, -1:]
+            ev[k] = model.values(self.X, F, self.R, self.B,
+                                 self.ROLLS_AVAILABLE, is_cmf=True)
+        return ev
+
+    def gradient(self, series: list=None, chunk: int=CHUNK) -> np.ndarray:
+        """ Exact change in expected value from disabling each series (the
+        negative of enabling it), every series in series_list by default. """
+        on = self.on[:self.M] if series is None else \
+            self.on[[self.index[s] for s in series]]
+        change = self.neighbors(series, chunk) - self.value()
+        return np.where(on, change, -change)
+
+    def moves(self, deltas: sparse.spmatrix, chunk: int=CHUNK) -> np.ndarray:
+        """ Expected value after each move, a row of -1/0/1 changes to the
+        enabled series, without applying any of them. """
+        deltas = sparse.csr_matrix(deltas)
+        ev = np.empty(deltas.shape[0])
+        for j in range(0, len(ev), chunk):
+            k = slice(j, j + chunk)
+            ev[k] = self.__values(deltas[k]@self.H)
+        return ev
+
+if __name__ == "__main__":
+    import time
+    evaluator = Evaluator()
+    print(f"expected value: {evaluator.value():.3f}")
+    start = time.perf_counter()
+    ev = evaluator.neighbors()
+    elapsed = time.perf_counter() - start
+    print(f"{len(ev)} neighbors in {elapsed:.3f}s: \
+{len(ev)/elapsed:,.0f} neighbors/sec")
+    best = int(np.argmax(ev))
+    print(f"best toggle: {evaluator.series[best]} ({ev[best]:.3f})")
@@ -0,0 +1,93 @@
+import numpy as np
+from . import prob, rv, model
+from .model import ROLLS, CONTINUE, CLAIM
+### $rolls inventory across games as an average reward MDP
+"""
+a use of $rolls arrives with probability ROLLS_F before each game and is
+kept until used, at most once per game as Model does. within a game the
+state at the end of a batch is (rolls left, batch max, stock, whether $rolls
+can still be used) and the decisions are to claim, continue or extend the
+batch with $rolls; across games relative value iteration over the stock
+gives the long-run average value per game, which is per claim since the
+last batch is always claimed
+"""
+STOCK = 16       # largest $rolls stock tracked, more arrivals are dropped
+EPSILON = 10**-9 # span of the value iteration update to stop at
+ITERS = 10**5    # maximum number of iterations
+FNAME = "rolls_policy.npz" # decision tables loadable by Model.load
+
+def game(V: np.ndarray, R: int, B: int, f: float, X: np.ndarray,
+         F: np.ndarray) -> tuple:
+    """ One game of backward induction given the relative values V of
+    starting the next game with each stock. Returns the value of starting
+    this game with each stock and the decisions at every batch end. """
+    S = len(V) - 1
+    # the next game starts after an arrival with probability f
+    H = (1 - f)*V + f*V[np.minimum(np.arange(S + 1) + 1, S)]
+    sizes = ([R % B] if R % B > 0 else []) + [B]*(R//B)
+    ends = R - np.cumsum(sizes)
+    FB = F[1:]**B
+    fB = np.diff(F**B)
+    action = np.zeros((R + 1, len(X), S + 1, 2), np.int8)
+    # G[b, s, u] is the value at the current batch end
+    G = None
+    for j in range(len(sizes) - 1, -1, -1):
+        claim = X[:, None] + H[None, :]
+        if G is None:
+            cont = np.full((1, S + 1, 2), -np.inf)
+        else:
+            fz = np.diff(F**sizes[j + 1])
+            cont = np.einsum("b,bsu->su", fz, G)[None]
+        G = np.empty((len(X), S + 1, 2))
+        # without $rolls, claim or continue
+        G[..., 0] = np.maximum(claim, cont[..., 0])
+        A = np.where(claim >= cont[..., 0], CLAIM, CONTINUE)
+        action[ends[j], :, :, 0] = A
+        # E[G(max(b, Z_B), s - 1, 0)] from the values above b
+        g = G[:, :-1, 0]
+        above = np.cumsum((fB[:, None]*g)[::-1], axis=0)[::-1]
+        extend = np.full((len(X), S + 1), -np.inf)
+        extend[:, 1:] = g*FB[:, None] + np.vstack([above[1:],
+                                                  np.zeros((1, S))])
+        stay = np.maximum(claim, cont[..., 1])
+        G[..., 1] = np.maximum(stay, extend)
+        action[ends[j], :, :, 1] = np.where(
+            extend > stay, ROLLS,
+            np.where(claim >= cont[..., 1], CLAIM, CONTINUE))
+    return np.diff(F**sizes[0])@G[..., 1], action
+
+def solve(R: int=prob.R, B: int=prob.B, f: float=model.ROLLS_F,
+          S: int=STOCK, dist: prob.Distribution=None, eps: float=EPSILON,
+          iters: int=ITERS) -> tuple:
+    """ Long-run average value per game, relative values of each stock and
+    the decision table indexed by [r, batch max, stock, $rolls usable]. """
+    dist = prob.current() if dist is None else dist
+    X, F = rv.support(dist.X), np.asarray(dist.F, dtype=np.float64)
+    V = np.zeros(S + 1)
+    for _ in range(iters):
+        W, action = game(V, R, B, f, X, F)
+        # the gain is between the smallest and largest change
+        lo, hi = np.min(W - V), np.max(W - V)
+        V = W - W[0]
+        if hi - lo < eps:
+            break
+    return (lo + hi)/2, V, action
+
+def save(fname: str, action: np.ndarray, R: int=prob.R, B: int=prob.B,
+         dist: prob.Distribution=None) -> None:
+    """ Saves a decision table with what it was solved for. """
+    dist = prob.current() if dist is None else dist
+    np.savez_compressed(fname, action=action, R=R, B=B,
+                        X=rv.support(dist.X))
+
+if __name__ == "__main__":
+    import time
+    start = time.perf_counter()
+    gain, V, action = solve()
+    print(f"solved in {time.perf_counter() - start:.3f}s")
+    print(f"average value per claim: {gain:.3f}")
+    print(f"   model, $rolls always: {model.Model().p_k.E():.3f}")
+    print(f"        model, no $rolls: {prob.Ef(prob.R, prob.B):.3f}")
+    print("value of each extra $rolls in stock: " +
+          ", ".join(f"{x:.2f}" for x in np.diff(V)[:8]))
+    save(FNAME, action)
@@ -1,8 +1,9 @@
 import bisect
-from functools import lru_cache
+import numpy as np
 from . import prob, rv
 
 ROLLS = -1             # declare $rolls reset
+CONTINUE, CLAIM = 0, 1 # other decisions of an inventory policy
 ROLLS_AVAILABLE = True # whether $rolls is allowed
 ROLLS_CYCLE = 8        # how often to use $rolls
 ROLLS_F = 1/ROLLS_CYCLE
@@ -13,24 +14,31 @@ class Model():
 
     def __init__(self, R: int=prob.R, B: int=prob.B,
                  ROLLS_AVAILABLE: bool=ROLLS_AVAILABLE,
-                 ROLLS_CYCLE: int=ROLLS_CYCLE) -> None:
+                 ROLLS_CYCLE: int=ROLLS_CYCLE,
+                 dist: prob.Distribution=None) -> None:
+        # distribution the model is evaluated on, the current one by default
+        self.dist = prob.current() if dist is None else dist
         self.R, self.B, self.offset = R, B, R % B
         self.ROLLS_AVAILABLE, self.ROLLS_CYCLE = ROLLS_AVAILABLE, ROLLS_CYCLE
         # precompute list of expected values for each roll
-        self.E = [prob.Ef(r, B) for r in range(prob.upper(R, B) + 1)]
+        self.E = self.dist.Ef_table(prob.upper(R, B), B)
         # methods from prob that are rebound to the specific parameters
-        self.fz, self.Fz = lambda z: prob.fz(z, B), prob.Fzs[B]
-        self.Ef = lambda r: self.E[r] if r < len(self.E) else prob.Ef(r, B)
+        self.Fzs, self.evzs = self.dist.powers(B)
+        self.fz, self.Fz = lambda z: self.dist.fz(z, B), self.Fzs[B]
+        self.Ef = lambda r: self.E[r] if r < len(self.E) else \
+            self.dist.Ef(r, B)
         self.f = self.__p_k
         if ROLLS_AVAILABLE:
             self.f = self.__rolls_p_k
             # generate cmf of p_k
-            self.Fk = prob.prefix_sum(list(map(self.__p_k, prob.X)))
+            self.Fk = prob.prefix_sum(list(map(self.__p_k, self.dist.X)))
             # the largest value k* such that Fk(k*) triggers the roll cutoff
-            self.kp = prob.X[bisect.bisect(self.Fk, ROLLS_F) - 2]
-            assert prob.cmf(self.Fk, self.kp) <= ROLLS_F, "valid cutoff"
+            self.kp = self.dist.X[bisect.bisect(self.Fk, ROLLS_F) - 2]
+            assert self.dist.cmf(self.Fk, self.kp) <= ROLLS_F, "valid cutoff"
             self.rolls_left = 0
-        self.p_k = prob.K.map(self.f)
+        # decision table of an inventory policy, see load
+        self.policy = None
+        self.p_k = self.dist.K.map(self.f)
         self.reset()
 
     def reset(self) -> None:
@@ -47,6 +55,25 @@ class Model():
         self.size += delta
         self.rolls_use = False
 
+    def load(self, fname: str) -> None:
+        """ Follows the decision tables of inventory.py instead of Ef and k*,
+        which depend on the $rolls in stock. """
+        tables = np.load(fname)
+        assert (tables["R"], tables["B"]) == (self.R, self.B) and \
+            np.array_equal(tables["X"], self.dist.X), "same game"
+        self.policy = tables["action"]
+
+    def decide(self) -> int:
+        """ Looks up the decision at the end of a batch in O(1). """
+        s = min(self.rolls_left, self.policy.shape[2] - 1) \
+            if self.rolls_use else 0
+        action = self.policy[self.r, self.dist.D[self.b], s, int(self.rolls_use)]
+        if action == ROLLS:
+            self.rolls()
+            return ROLLS
+        if action == CLAIM:
+            return self.l.index(self.b)
+
     def update(self, k: int) -> int:
         """ Returns an index if something is worth claiming, otherwise None. """
         # new batch, reset seen and b, the max of the samples we've seen
@@ -57,6 +84,8 @@ class Model():
         self.b = max(self.b, k)
         self.r -= 1
 
+        if self.policy is not None:
+            return self.decide() if len(self.l) == self.size else None
         # no need to stop early, wait until the batch is complete 
         if self.b > self.Ef(self.r) and len(self.l) == self.size:
             # use $rolls if emitting this bad of a value has probability 1/8
@@ -71,7 +100,7 @@ class Model():
         """ Expected value if the current batch is continued.
         k is the best value in the current batch. """
         n = r % self.B
-        return prob.capped(prob.Z, prob.Fzs[n], prob.evzs[n], k)
+        return self.dist.capped(self.dist.Z, self.Fzs[n], self.evzs[n], k)
 
     def status_quo(self, r: int, k: int) -> float:
         """ Represents the current value if we don't buy or sell. """
@@ -98,15 +127,26 @@ class Model():
 
     def __Z(self, r: int) -> list:
         """ Returns the correct cmf of Z_n, accounting for offset. """
-        return prob.Fzs[self.offset if r >= self.R - self.offset else self.B]
+        return self.Fzs[self.offset if r >= self.R - self.offset else self.B]
+
+    def __cache_F_r(self) -> None:
+        """ Generate cache for F_r. """
+        r = np.arange(self.R + 1)
+        i = np.searchsorted(self.dist.X, self.E[:self.R + 1], "right")
+        # since we never claim in the middle of the batch, use Z instead of X
+        p = np.where(r >= self.R - self.offset,
+                     self.Fzs[self.offset, i], self.Fzs[self.B, i])
+        p[(r % self.B != 0) | (r == self.R)] = 1
+        # product of the probabilities of not claiming from r to R
+        self.Fr = np.cumprod(p[::-1])[::-1]
 
-    @lru_cache(maxsize=None)
     def F_r(self, r: int) -> float:
         """ Probability of getting to roll r. The cmf of
         the probability of emitting a value at roll r. """
-        # since we never claim in the middle of the batch, use Z instead of X  
-        p = prob.cmf(self.__Z(r), self.Ef(r)) if r % self.B == 0 else 1
-        return 1 if r == self.R else p*self.F_r(r + 1)
+        # lazily generate cache on demand
+        if not hasattr(self, "Fr"):
+            self.__cache_F_r()
+        return self.Fr[max(r, 0)]
 
     def p_r(self, r: int) -> float:
         """ Probability of emitting a value at roll r, pmf of F_r. """
@@ -115,28 +155,31 @@ class Model():
     def __cache_p_k(self) -> None:
         """ Generate cache for p_k """
         # probability that a value is emitted given we're at level r 
-        self.poss = [1 - prob.cmf(self.__Z(r), self.Ef(r))
+        self.poss = [1 - self.dist.cmf(self.__Z(r), self.Ef(r))
                      for r in range(self.R)]
         # prefix sum of the probability we reach level r over its value emission   
         i, f = self.R - self.offset, lambda r: self.p_r(r + 1)/self.poss[r]
         self.cond = prob.prefix_sum(list(map(f, range(i))) + [0]*self.offset)
         self.coff = prob.prefix_sum([0]*i + list(map(f, range(i, self.R))))
+        # p_k over the whole support, a bounded cache owned by the model
+        i = np.minimum(np.searchsorted(self.E, self.dist.X, "right"), self.R)
+        fz = np.array([self.fz(k) for k in self.dist.X])
+        fo = np.array([self.dist.fz(k, self.offset) for k in self.dist.X])
+        self.pk = fz*np.asarray(self.cond)[i] + fo*np.asarray(self.coff)[i]
 
-    @lru_cache(maxsize=None)
     def __p_k(self, k: int) -> float:
         """ Probability of emitting the kakera value k. """
         # lazily generate cache on demand
-        if not hasattr(self, "poss"):
+        if not hasattr(self, "pk"):
             self.__cache_p_k()
-        i = min(bisect.bisect(self.E, k), self.R)
-        return self.fz(k)*self.cond[i] + prob.fz(k, self.offset)*self.coff[i]
+        return self.pk[self.dist.D[k]]
 
     ### Modified introspective models with $rolls
 
     def p_last(self, k: int) -> float:
         """ Probability of emtting the kakera value k on the last layer. """
-        return (1 + prob.cmf(self.Fz, self.kp))*self.fz(k) if k > self.kp \
-               else prob.fz(k, 2*self.B)
+        return (1 + self.dist.cmf(self.Fz, self.kp))*self.fz(k) if k > self.kp \
+               else self.dist.fz(k, 2*self.B)
 
     def __rolls_p_k(self, k: int) -> float:
         """ Probability of emitting the kakera value k. """
@@ -148,25 +191,26 @@ class GeneralModel(Model):
 
     def __init__(self, R: int=prob.R, B: int=prob.B,
                  ROLLS_AVAILABLE: bool=ROLLS_AVAILABLE,
-                 ROLLS_CYCLE: int=ROLLS_CYCLE) -> None:
-        super().__init__(R, B, ROLLS_AVAILABLE, ROLLS_CYCLE)
+                 ROLLS_CYCLE: int=ROLLS_CYCLE,
+                 dist: prob.Distribution=None) -> None:
+        super().__init__(R, B, ROLLS_AVAILABLE, ROLLS_CYCLE, dist)
         if ROLLS_AVAILABLE:
-            l, r = 0, prob.N
+            l, r = 0, self.dist.N
             while l < r:
                 m = (l + r + 1)>>1
-                f = prob.cmf(self.Fz, prob.X[m])
+                f = self.dist.cmf(self.Fz, self.dist.X[m])
                 if self.p_r(1)*f/(1 - f) <= ROLLS_F:
                     l, r = m, r
                 else:
                     l, r = l, m - 1
-            self.kp = prob.X[l]
+            self.kp = self.dist.X[l]
 
-            f = prob.cmf(self.Fz, self.kp)
+            f = self.dist.cmf(self.Fz, self.kp)
             assert self.p_r(1)*f/(1 - f) <= ROLLS_F, "valid cutoff"
 
-            pmf = rv.norm([self.fz(k)*(k > self.kp) for k in prob.K])
-            self.p_last = rv.RandomVariable(prob.K, pmf)
-            self.p_k = prob.K.map(self.f)
+            pmf = rv.norm([self.fz(k)*(k > self.kp) for k in self.dist.K])
+            self.p_last = rv.RandomVariable(self.dist.K, pmf)
+            self.p_k = self.dist.K.map(self.f)
 
     def rolls(self) -> None:
         """ Update the model's parameters if it uses $rolls. """
@@ -174,6 +218,77 @@ class GeneralModel(Model):
         self.r += delta
         self.size += delta
 
+### Vectorized expected values
+
+def power(F: np.ndarray, b: int) -> np.ndarray:
+    """ F**b by repeated squaring, much faster than pow for small b. """
+    rtn = np.ones_like(F)
+    while b > 0:
+        if b & 1 == 1:
+            rtn *= F
+        b >>= 1
+        F = F*F if b > 0 else F
+    return rtn
+
+def values(X: list, P: np.ndarray, R: int=prob.R, B: int=prob.B,
+           ROLLS_AVAILABLE: bool=ROLLS_AVAILABLE,
+           is_cmf: bool=False) -> np.ndarray:
+    """ Model(R, B, ROLLS_AVAILABLE).p_k.E() for every row of pmfs (or cmfs
+    with a leading 0) over the shared support X at once. """
+    X, P = rv.support(X), np.atleast_2d(P)
+    F = P if is_cmf else np.zeros((len(P), len(X) + 1))
+    if not is_cmf:
+        np.cumsum(P, axis=1, out=F[:, 1:])
+    i, rows, offset = np.arange(len(F)), np.arange(len(F))[:, None], R % B
+    def prefix(Fz: np.ndarray) -> np.ndarray:
+        """ Expected value prefix sum of a cmf, like prob.powers. """
+        ev = np.zeros_like(Fz)
+        np.cumsum(X[:Fz.shape[1] - 1]*np.diff(Fz), axis=1, out=ev[:, 1:])
+        return ev
+    def at(A: np.ndarray, u: np.ndarray, side: str="right") -> np.ndarray:
+        return A[rows, np.searchsorted(X, u, side)]
+    Fz = power(F, B)
+    evz = prefix(Fz)
+    Fo = power(F, offset) if offset > 0 else Fz
+    evo = prefix(Fo) if offset > 0 else evz
+
+    # Ef at the end of every batch, the only places the model claims
+    J = len(range(0, R, B))
+    E = np.zeros((len(F), J))
+    for j in range(1, J):
+        u = E[:, j - 1:j]
+        E[:, j:j + 1] = u*at(Fz, u) + evz[:, -1:] - at(evz, u)
+    # probability of not claiming at each batch end, where the first
+    # batch is a partial one of size offset, and of reaching each batch end
+    Fr = np.hstack([at(Fo if offset > 0 and j == J - 1 else Fz,
+                       E[:, j:j + 1]) for j in range(J)])
+    w = np.ones_like(Fr)
+    w[:, :-1] = np.cumprod(Fr[:, :0:-1], axis=1)[:, ::-1]
+
+    # p_k is the pmf of the batch max where it's at least Ef, weighted by
+    # the probability of reaching that batch end
+    Fzs = [Fo if offset > 0 and j == J - 1 else Fz for j in range(J)]
+    evs = [evo if offset > 0 and j == J - 1 else evz for j in range(J)]
+    first = np.searchsorted(X, E, "left")
+    ev = sum(w[:, j]*(evs[j][:, -1] - evs[j][i, first[:, j]])
+             for j in range(J))
+    if not ROLLS_AVAILABLE:
+        return ev
+    # k* is the largest value where the cmf of p_k is at most ROLLS_F,
+    # binary searched on the number of support values it includes
+    def Fk(c: np.ndarray) -> np.ndarray:
+        return sum(w[:, j]*np.maximum(Fzs[j][i, c] - Fzs[j][i, first[:, j]],
+                                      0) for j in range(J))
+    lo, hi = np.zeros(len(F), np.int64), np.full(len(F), len(X))
+    while np.any(lo < hi):
+        mid = (lo + hi + 1)>>1
+        valid = Fk(mid) <= ROLLS_F
+        lo, hi = np.where(valid, mid, lo), np.where(valid, hi, mid - 1)
+    # the last layer, Z_2B below k* and Z_B above it
+    ev2 = prefix(Fz[:, :lo.max() + 1]**2)[i, lo]
+    last = (1 + Fz[i, lo])*(evz[i, -1] - evz[i, lo]) + ev2
+    return ev + w[:, 0]*(1 - Fr[:, 0])*(last - evz[i, -1])
+
 def rename(X: rv.RandomVariable, name: str) -> str:
     """ Renames the random variable. """
     X.name = name
@@ -0,0 +1,57 @@
+import os, time
+from multiprocessing import Pool
+import numpy as np
+from . import model, test_model
+# simulation split over a process pool, each worker playing its own
+# stream of games (with its own stock of $rolls) from an independent seed
+
+WORKERS = os.cpu_count() # number of processes
+SEED = 1                 # root seed, worker seeds are spawned from it
+
+def worker(task: tuple) -> tuple:
+    """ Simulates a contiguous block of games with its own rng. """
+    model_type, args, seed, index, games, chunk, keep = task
+    m, rng = model_type(*args), np.random.default_rng(seed)
+    counts, total, values = test_model.histograms(m.R), 0, []
+    for i in range(index, index + games, chunk):
+        v = test_model.simulate_batch(m, min(chunk, index + games - i), i,
+                                      rng, counts)
+        total += int(v.sum())
+        if keep:
+            values.append(v)
+    return counts, total, np.concatenate(values) if keep else None
+
+def simulate(games: int, workers: int=WORKERS, seed: int=SEED,
+             model_type=model.Model, args: tuple=(),
+             chunk: int=test_model.CHUNK, values: bool=False,
+             verbose: bool=True) -> tuple:
+    """ Simulates games over a process pool. Returns the average value,
+    the merged histograms and optionally every game's value in order.
+    Results only depend on the seed and the number of workers. """
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    # split the games as evenly as possible into contiguous blocks
+    sizes = [games//workers + (i < games % workers) for i in range(workers)]
+    starts = np.cumsum([0] + sizes[:-1])
+    tasks = [(model_type, args, s, int(i), n, chunk, values)
+             for s, i, n in zip(seeds, starts, sizes) if n > 0]
+
+    start = time.perf_counter()
+    with Pool(min(workers, len(tasks))) as pool:
+        results = pool.map(worker, tasks)
+    elapsed = time.perf_counter() - start
+
+    counts = results[0][0]
+    for partial, _, _ in results[1:]:
+        for name, count in partial.items():
+            counts[name] += count
+    total = sum(result[1] for result in results)
+    if verbose:
+        print(f"{games} games in {elapsed:.3f}s on {len(tasks)} workers: \
+{games/elapsed:,.0f} games/sec")
+    v = np.concatenate([result[2] for result in results]) if values else None
+    return total/games, counts, v
+
+if __name__ == "__main__":
+    ev, counts, _ = simulate(10**7)
+    print(f"simulated value: {ev:.3f}")
+    print(f"  model value: {model.Model().p_k.E():.3f}")
@@ -0,0 +1,96 @@
+import numpy as np
+from . import prob, rv, model
+### exact evaluation of threshold policies
+"""
+a policy claims the best value of the current batch as soon as it's above
+the threshold for the number of rolls left after the roll, which also fixes
+the position in the batch, and may use $rolls on a final claim of at most a
+cutoff, replaying the last B positions with the batch max kept. the forward
+pass tracks the distribution of the batch max for every policy at once
+"""
+
+def thresholds(m: model.Model) -> np.ndarray:
+    """ Threshold table of a model: Ef at the end of every batch, never in
+    the middle of one, indexed by the rolls left after a roll. """
+    r = np.arange(m.R)
+    return np.where(r % m.B == 0, [m.Ef(i) for i in r], np.inf)
+
+def roll(M: np.ndarray, F: np.ndarray) -> np.ndarray:
+    """ Distribution of the batch max after one more roll, where column 0
+    is an empty batch and column k + 1 is a max of X[k]. """
+    C = np.cumsum(M, axis=1)
+    C[:, 0] = 0
+    C[:, 1:] *= F[1:]
+    return np.diff(C, axis=1, prepend=0)
+
+def claim(M: np.ndarray, X: np.ndarray, T: np.ndarray) -> np.ndarray:
+    """ Removes and returns the mass of the batch maxes above T. """
+    mask = X > T[:, None]
+    claimed = M[:, 1:]*mask
+    M[:, 1:] -= claimed
+    return claimed
+
+def evaluate(T: np.ndarray, kp: np.ndarray=None, R: int=prob.R,
+             B: int=prob.B, dist: prob.Distribution=None) -> tuple:
+    """ Exact expected value, pmf of the value claimed, pmf of the rolls
+    left before the claimed roll (0 if nothing is claimed) and probability
+    of using $rolls, for every row of thresholds T over r in [0, R) and
+    $rolls cutoff in kp (none by default), assuming $rolls is in stock. """
+    dist = prob.current() if dist is None else dist
+    X, F = rv.support(dist.X), np.asarray(dist.F, dtype=np.float64)
+    T = np.atleast_2d(np.asarray(T, dtype=np.float64))
+    P, offset = len(T), R % B
+    ends = set(R - np.cumsum(([offset] if offset > 0 else []) + [B]*(R//B)))
+    M = np.zeros((P, len(X) + 1))
+    M[:, 0] = 1
+    value, rolls = np.zeros((P, len(X))), np.zeros((P, R + 1))
+    # nothing is extended when there are no rolls to claim on
+    extend = np.zeros((P, len(X)))
+    for r in range(R - 1, -1, -1):
+        M = roll(M, F)
+        claimed = claim(M, X, T[:, r])
+        if r == 0 and kp is not None:
+            # a final claim of at most k* is extended by $rolls instead
+            extend = claimed*(X <= np.asarray(kp, dtype=np.float64)[:, None])
+            claimed -= extend
+        value += claimed
+        rolls[:, r + 1] += claimed.sum(axis=1)
+        # a new batch starts with nothing seen
+        if r in ends:
+            M[:, 0], M[:, 1:] = M.sum(axis=1), 0
+    uses = np.zeros(P)
+    if kp is not None:
+        # the extension is the last B positions again, keeping the max
+        E = np.hstack([np.zeros((P, 1)), extend])
+        uses = extend.sum(axis=1)
+        for r in range(B - 1, -1, -1):
+            E = roll(E, F)
+            # positions before the game's first roll have no threshold
+            if r < R:
+                claimed = claim(E, X, T[:, r])
+                value += claimed
+                rolls[:, r + 1] += claimed.sum(axis=1)
+        M += E
+    rolls[:, 0] = M.sum(axis=1)
+    return value@X, value, rolls, uses
+
+if __name__ == "__main__":
+    import time
+    m = model.Model(ROLLS_AVAILABLE=False)
+    T = thresholds(m)
+    # heuristics: scaled thresholds at batch ends, or claim as soon as
+    # the running max is above the scaled threshold of the next batch end
+    scale = np.linspace(0.5, 1.5, 1000)
+    r = np.arange(prob.R)
+    early = np.array([m.Ef(i - i % prob.B) for i in r])
+    policies = np.vstack([np.outer(scale, T), np.outer(scale, early)])
+    start = time.perf_counter()
+    ev, *_ = evaluate(policies)
+    elapsed = time.perf_counter() - start
+    print(f"{len(policies)} policies in {elapsed:.3f}s")
+    print(f"optimal: {prob.Ef(prob.R, prob.B):.3f}, model policy: \
+{evaluate(T)[0][0]:.3f}")
+    for name, l in [("batch end", ev[:len(scale)]),
+                    ("early", ev[len(scale):])]:
+        i = np.argmax(l)
+        print(f"best {name} heuristic: {l[i]:.3f} at scale {scale[i]:.3f}")
@@ -1,54 +1,15 @@
-import bisect, sys, math
+import bisect, math
 from functools import lru_cache
+import numpy as np
 from .rv import RandomVariable, prefix_sum, query
-from .data import X, p
-sys.setrecursionlimit(10**4)
+from . import data
 
-### Random variables, pmfs and cmfs, constants, and setup
-"""
-X is a discrete random variable (r.v.)
-p is its corresponding probability mass function (pmf)
-E[X] is the expected value of X
-"""
-K = RandomVariable(X, p, "kakera")
-
-# number of discrete values, number of rolls, number of rolls per batch
-N, R, B = len(X), 30, 10
-# value to index
-D = {x: i for i, x in enumerate(X)}
-
-def pmf(p: list, u: float) -> float:
-    """ Finds the value of the pmf at a value in/not in the underlying r.v. """
-    return p[D[u]] if u in D else 0
-
-def cmf(F: list, u: float) -> float:
-    """ Finds the value of the cmf at a value in/not in the underlying r.v. """
-    # use F if u is in the range of the r.v., otherwise binary search
-    return F[D[u] + 1] if u in D else F[bisect.bisect(X, u)]
-
-# prefix sum of probability list, aka the cumulative mass function (cmf)
-F, f = prefix_sum(p), lambda x: pmf(p, x)
-# expected value prefix sum
-ev = prefix_sum([X[i]*p[i] for i in range(N)])
-
-# Z is the r.v. corresponding to sampling X b times and taking the max value 
-# Z has the same support set as X but a different pmf
-Z, BATCHES = list(X), R//B
-
-# cmf of Z is just the power of each term in the cmf of X
-Fzs = [[1]*(N + 1)]
-for i in range(B):
-    Fzs.append([Fzs[-1][i]*F[i] for i in range(N + 1)])
-
-# expected value prefix sum similar to X 
-evzs = [prefix_sum([X[i]*(Fzs[b][i + 1] - Fzs[b][i]) for i in range(N)])
-        for b in range(len(Fzs))]
-Fz = Fzs[B]
-
-@lru_cache(maxsize=None)
-def fz(z: float, b: int=B) -> float:
-    """ pmf of Z. """
-    return pow(F[D[z] + 1], b) - pow(F[D[z]], b)
+EF_CACHE = 32    # number of Ef tables and cmf powers to keep in memory
+FZ_CACHE = 2**16 # number of values of the pmf of Z to keep in memory
+
+# number of rolls, number of rolls per batch
+R, B = 30, 10
+BATCHES = R//B
 
 def lower(r: int, b: int=B) -> int:
     """ Returns the  largest value n such that n <= r and n % B == 0. """
@@ -58,17 +19,144 @@ def upper(r: int, b: int=B) -> int:
     """ Returns the smallest value n such that n >= r and n % B == 0. """
     return r + (-r % b)
 
+### Random variables, pmfs and cmfs, constants, and setup
+"""
+X is a discrete random variable (r.v.)
+p is its corresponding probability mass function (pmf)
+E[X] is the expected value of X
+"""
+
+class Distribution:
+
+    """ Tables derived from a kakera random variable, built on demand. """
+
+    def __init__(self, X: list, p: list, name: str="kakera") -> None:
+        self.X, self.p, self.K = X, p, RandomVariable(X, p, name)
+        # number of discrete values, value to index
+        self.N, self.D = len(X), {x: i for i, x in enumerate(X)}
+        # prefix sum of probability list, aka the cumulative mass function
+        self.F, self.f = prefix_sum(p), lambda x: self.pmf(p, x)
+        # expected value prefix sum
+        self.ev = prefix_sum([X[i]*p[i] for i in range(self.N)])
+        # Z is the r.v. corresponding to sampling X b times and taking the max
+        # Z has the same support set as X but a different pmf
+        self.Z = list(X)
+
+        # caches are owned by the distribution so they're never stale
+        self.powers = lru_cache(maxsize=EF_CACHE)(self.powers)
+        self.fz = lru_cache(maxsize=FZ_CACHE)(self.fz)
+        self.__Er = lru_cache(maxsize=EF_CACHE)(self.__Er)
+        self.__Ef = lru_cache(maxsize=EF_CACHE)(self.__Ef)
+
+    def pmf(self, p: list, u: float) -> float:
+        """ Finds the value of the pmf at a value in/not in the r.v. """
+        return p[self.D[u]] if u in self.D else 0
+
+    def cmf(self, F: list, u: float) -> float:
+        """ Finds the value of the cmf at a value in/not in the r.v. """
+        # use F if u is in the range of the r.v., otherwise binary search
+        return F[self.D[u] + 1] if u in self.D else \
+               F[bisect.bisect(self.X, u)]
+
+    def powers(self, b: int) -> tuple:
+        """ cmfs of Z_n for every n in [0, b] and their expected value sums. """
+        # cmf of Z is just the power of each term in the cmf of X
+        Fzs = np.asarray(self.F, dtype=np.float64)**np.arange(b + 1)[:, None]
+        # expected value prefix sum similar to X
+        evzs = np.zeros_like(Fzs)
+        np.cumsum(np.asarray(self.X)*np.diff(Fzs), axis=1, out=evzs[:, 1:])
+        return Fzs, evzs
+
+    @property
+    def Fzs(self) -> np.ndarray: return self.powers(B)[0]
+    @property
+    def evzs(self) -> np.ndarray: return self.powers(B)[1]
+    @property
+    def Fz(self) -> np.ndarray: return self.Fzs[B]
+
+    def fz(self, z: float, b: int=B) -> float:
+        """ pmf of Z. """
+        F, i = self.F, self.D[z]
+        return pow(F[i + 1], b) - pow(F[i], b)
+
+    def capped(self, X: list, F: "cmf", prefix: list, u: float) -> float:
+        """ Returns E[max(X, u)] in O(log n). """
+        i = bisect.bisect(X, u)
+        return u*F[i] + query(prefix, i, self.N - 1)
+
+    # list of random variables and their corresponding cmfs to index for Er
+    @property
+    def rvs(self) -> list: return [self.X, self.Z]
+    @property
+    def cmfs(self) -> list: return [self.F, self.Fz]
+    @property
+    def evs(self) -> list: return [self.ev, self.evzs[B]]
+
+    def Er_table(self, i: int, R: int) -> np.ndarray:
+        """ Er(i, r) for every r in [0, R], built bottom-up. """
+        rv, F, ev = self.rvs[i], self.cmfs[i], self.evs[i]
+        table = np.zeros(R + 1)
+        for r in range(1, R + 1):
+            table[r] = self.capped(rv, F, ev, table[r - 1])
+        return table
+
+    def Ef_table(self, R: int, b=B) -> np.ndarray:
+        """ Ef(r, b) for every r in [0, R], for one batch size or a list of
+        batch sizes at once (one row per batch size). """
+        bs = np.atleast_1d(b)
+        rows, X = np.arange(len(bs)), np.asarray(self.X)
+        Fzs, evzs = self.powers(int(bs.max()))
+        table = np.zeros((len(bs), R + 1))
+        for r in range(1, R + 1):
+            # size of the batch that ends with r rolls left
+            n = r % bs
+            n[n == 0] = bs[n == 0]
+            u = table[rows, np.maximum(r - n, 0)]
+            i = np.searchsorted(X, u, "right")
+            table[:, r] = u*Fzs[n, i] + evzs[n, -1] - evzs[n, i]
+        return table[0] if np.ndim(b) == 0 else table
+
+    # tables are cached in lengths of powers of two so memory stays bounded
+    def __Er(self, i: int, n: int) -> np.ndarray:
+        return self.Er_table(i, n - 1)
+    def __Ef(self, b: int, n: int) -> np.ndarray:
+        return self.Ef_table(n - 1, b)
+
+    def Er(self, i: int, r: int) -> float:
+        """ E[X_r], where X_r is X with possibly r more samples. """
+        # if r = 0, then we're out of samples and has a constant value of 0
+        return 0 if r <= 0 else self.__Er(i, 1 << int(r).bit_length())[r]
+
+    def Ef(self, r: int, b: int=B) -> float:
+        """ E[X_f], where Z_r is extended to r's that are not multiples of 10. """
+        return 0 if r <= 0 else self.__Ef(b, 1 << int(r).bit_length())[r]
+
+    def clear(self) -> None:
+        """ Clears the cached tables. """
+        for f in [self.powers, self.fz, self.__Er, self.__Ef]:
+            f.cache_clear()
+
+    # extension 3: buying rolls and extension 4: selling rolls
+    def price(self, r: int, k: int, b: int=B) -> float:
+        """ The amount of kakera one should pay if they have r rolls and buy k. """
+        return self.Ef(r + k, b) - self.Ef(r, b)
+
+def current() -> Distribution:
+    """ The distribution of the current dataset, see data.use. """
+    return data.dataset().dist
+
 ### probability theory functions
 
-def E(p: list, rv: list=X, f=lambda x: x) -> float:
+def E(p: list, rv: list=None, f=lambda x: x) -> float:
     """ Expected value of a pmf represented by a list. """
+    rv = current().X if rv is None else rv
     return sum(f(x)*p for x, p in zip(rv, p))
 
-def Var(p: list, rv: list=X) -> float:
+def Var(p: list, rv: list=None) -> float:
     """ Var[X] = E[(x - u)^2] = E[X^2] - E[x]^2. """
-    return E(p, X, lambda x: x*x) - E(p, rv)**2
+    return E(p, None, lambda x: x*x) - E(p, rv)**2
 
-def std(p: list, rv: list=X) -> float:
+def std(p: list, rv: list=None) -> float:
     """ sigma^2 = Var[x] so sigma = standard deviation = sqrt(Var[X]). """
     return math.sqrt(Var(p, rv))
 
@@ -78,32 +166,23 @@ def __capped(X: list, p: list, u: float) -> float:
     """ Returns E[X], but with the values capped at a minimum of u. """
     return E(p, X, lambda x: max(x, u))
 
-def capped(X: list, F: "cmf", prefix: list, u: float) -> float:
-    """ Returns E[max(X, u)] in O(log n). """
-    i = bisect.bisect(X, u)
-    return u*F[i] + query(prefix, i, N - 1)
-
-@lru_cache(maxsize=None)
-def Er(i: int, r: int) -> float:
-    """ E[X_r], where X_r is X with possibly r more samples. """
-    # if r = 0, then we're out of samples and has a constant value of 0
-    return 0 if r <= 0 else capped(rvs[i], cmfs[i], evs[i], Er(i, r - 1))
+# tables and functions of the current distribution, computed on first access
+TABLES = ["X", "p", "K", "N", "D", "F", "f", "ev", "Z", "Fzs", "evzs", "Fz",
+          "rvs", "cmfs", "evs", "pmf", "cmf", "powers", "fz", "capped",
+          "Er_table", "Ef_table", "Er", "Ef", "clear", "price"]
 
-@lru_cache(maxsize=None)
-def Ef(r: int, b: int=B) -> float:
-    """ E[X_f], where Z_r is extended to r's that are not multiples of 10. """
-    n = r % b if r % b != 0 else b
-    return 0 if r <= 0 else capped(Z, Fzs[n], evzs[n], Ef(r - n, b))
+def __getattr__(name: str):
+    """ Forwards tables and functions to the current distribution. """
+    if name in TABLES:
+        return getattr(current(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# list of random variables and their corresponding cmfs to index for lru_cache
-rvs, cmfs, evs = [X, Z], [F, Fz], [ev, evzs[B]]
-
-# extension 3: buying rolls and extension 4: selling rolls
-def price(r: int, k: int, b: int=B) -> float:
-    """ The amount of kakera one should pay if they have r rolls and buy k. """
-    return Ef(r + k, b) - Ef(r, b)
+__all__ = ["EF_CACHE", "FZ_CACHE", "R", "B", "BATCHES", "lower", "upper",
+           "Distribution", "current", "E", "Var", "std", "RandomVariable",
+           "prefix_sum", "query"] + TABLES
 
 if __name__ == "__main__":
+    Er, Ef = current().Er, current().Ef
     # basic model, once you sample X you can't "go back" to the value
     print(Er(0, 0), Er(0, 1), Er(0, R))
     # extension 1: batches of 10
@@ -112,4 +191,3 @@ if __name__ == "__main__":
     # extension 2: fractional batches
     print(Ef(0), Ef(10), Ef(20), Ef(R))
     print(Ef(1), Ef(12), Ef(25), Ef(27))
-
@@ -1,8 +1,11 @@
-import random, bisect, math
+import random, math
+from functools import cached_property
+import numpy as np
 # library implementing a random variable
 # TODO: absorb testing.py
 
 random.seed(1)
+generator = np.random.default_rng(1) # source of batched samples
 EPSILON = 10**-3 # permissible distance from 1
 ITERS = 10**6    # iterations for emprical expected value
 
@@ -19,7 +22,7 @@ def norm_cmf(l: list) -> list:
 
 def nonneg(l: list) -> bool:
     """ Whether all the values in a list are positive. """
-    return all(map(lambda x: x >= 0, l))
+    return bool(np.all(np.asarray(l) >= 0))
 
 def diff(x: float, y: float, tol: float=EPSILON) -> bool:
     """ Whether two numbers are sufficiently close. """
@@ -27,11 +30,11 @@ def diff(x: float, y: float, tol: float=EPSILON) -> bool:
 
 def pmf(l: list, tol: float=EPSILON) -> bool:
     """ Whether a list can be interpreted as a pmf. """
-    return nonneg(l) and diff(sum(l), 1, tol)
+    return nonneg(l) and diff(np.sum(l), 1, tol)
 
 def cmf(l: list, tol: float=EPSILON) -> bool:
     """ Whether a list can be interpreted as a cmf. """
-    return nonneg(l) and l == sorted(l) and diff(l[-1], 1, tol)
+    return nonneg(l) and bool(np.all(np.diff(l) >= 0)) and diff(l[-1], 1, tol)
 
 ### random variable
 
@@ -46,83 +49,134 @@ def prefix_sum(l: list) -> list:
         prefix[i + 1] = prefix[i] + l[i]
     return prefix
 
+def support(X: list) -> np.ndarray:
+    """ Converts a support set into a contiguous int64 or float64 array. """
+    X = np.asarray(X)
+    integral = np.issubdtype(X.dtype, np.integer)
+    return np.ascontiguousarray(X, np.int64 if integral else np.float64)
+
+def apply(f, X: np.ndarray) -> np.ndarray:
+    """ Applies f to every value of X, all at once if f is a ufunc. """
+    return f(X) if isinstance(f, np.ufunc) else \
+        np.array([f(x) for x in X.tolist()])
+
+def scalar(a):
+    """ Unwraps the result of a vectorized query on a scalar. """
+    return a[()] if isinstance(a, np.ndarray) and a.ndim == 0 else a
+
 class RandomVariable:
 
     """ A random variable. """
 
     def __init__(self, X: list, p: list, name: str="rv",
                  is_cmf: bool=False, normalize: bool=False) -> None:
-        p = (norm_cmf if is_cmf else norm)(p) if normalize else p
-        self.X, self.p, self.name = X, p, name # list of values, probabilities
+        p = np.asarray(p, dtype=np.float64)
+        p = p/(p.max() if is_cmf else p.sum()) if normalize else p
 
         if isinstance(X, RandomVariable): # inherit attributes for efficiency
-            for attr in ["__len__", "__iter__", "__getitem__", "D"]:
-                setattr(self, attr, getattr(X, attr))
+            if "D" in X.__dict__:
+                self.D = X.D
+            X = X.X
         else:
-            self.D = {x: i for i, x in enumerate(X)} # value to index
-            assert sorted(X) == list(X), "support set must be sorted"
+            X = support(X)
+            assert np.all(X[1:] >= X[:-1]), "support set must be sorted"
 
+        F = None
         if is_cmf:
             assert len(X) == len(p) - 1, "values not the same length as cmf"
             assert cmf(p), "not a valid cmf"
-            self.p, self.F = [p[i + 1] - p[i] for i in range(len(X))], p
+            p, F = np.diff(p), np.ascontiguousarray(p)
         else:
             assert len(X) == len(p),     "values not the same length as pmf"
             assert pmf(p), "not a valid pmf"
-            self.F = prefix_sum(p) # cmf
-
-        self.ev = prefix_sum([x*p for x, p in zip(self, self.p)])
+        self.__setup(X, np.ascontiguousarray(p), name, F)
+
+    def __setup(self, X: np.ndarray, p: np.ndarray, name: str,
+                F: np.ndarray=None) -> None:
+        """ Stores the arrays, F and ev are derived lazily. """
+        self.X, self.p, self.name = X, p, name # array of values, probabilities
+        if F is not None:
+            self.F = F
+
+    @classmethod
+    def trusted(cls, X: np.ndarray, p: np.ndarray, name: str="rv",
+                F: np.ndarray=None) -> "RandomVariable":
+        """ Skips validation, for random variables derived internally. """
+        rv = cls.__new__(cls)
+        rv.__setup(X.X if isinstance(X, RandomVariable) else X, p, name, F)
+        return rv
+
+    @cached_property
+    def F(self) -> np.ndarray:
+        """ Prefix sum of the pmf, aka the cumulative mass function (cmf). """
+        return np.concatenate(([0.0], np.cumsum(self.p)))
+
+    @cached_property
+    def ev(self) -> np.ndarray:
+        """ Expected value prefix sum. """
+        return np.concatenate(([0.0], np.cumsum(self.X*self.p)))
+
+    @cached_property
+    def D(self) -> dict:
+        """ Value to index. """
+        return {x: i for i, x in enumerate(self.X.tolist())}
 
     ### Python "magic" class methods
 
-    def __repr__(self) -> str: return f"RandomVariable({self.X}, {self.p})"
+    def __repr__(self) -> str:
+        return f"RandomVariable({self.X.tolist()}, {self.p.tolist()})"
     def  __str__(self) -> str: return f"RandomVariable {self.name}: \n\
 mean = {self.E():.3f} +/- {self.std():.3f} (std)"
     def __len__(self) -> int: return len(self.X)
-    def __iter__(self): return self.X.__iter__()
+    def __iter__(self): return iter(self.X.tolist())
     def __getitem__(self, i: int) -> float: return self.X[i]
     def __call__(self, k: float) -> float: return self.pmf(k)
 
     ### properties intrinsic to a random variable
 
     def pmf(self, u: float) -> float:
-        """ Finds the pmf at a value in/not in the underlying r.v. """
-        return self.p[self.D[u]] if u in self.D else 0
+        """ Finds the pmf at value(s) in/not in the underlying r.v. """
+        if np.ndim(u) == 0:
+            return self.p[self.D[u]] if u in self.D else 0
+        i = np.minimum(np.searchsorted(self.X, u), len(self.X) - 1)
+        return np.where(self.X[i] == u, self.p[i], 0)
 
     def cmf(self, u: float) -> float:
-        """ Finds the cmf at a value in/not in the underlying r.v. """
-        # use F if u is in the range of the r.v., otherwise binary search
-        return self.F[self.D[u] + 1] if u in self.D else \
-               self.F[bisect.bisect(self.X, u)]
+        """ Finds the cmf at value(s) in/not in the underlying r.v. """
+        return scalar(self.F[np.searchsorted(self.X, u, "right")])
 
     ### transformations
 
     def transform(self, f):
         """ Returns a new random variable transformed by a given function. """
-        freq = {}
-        for x in self:
-            y = f(x)
-            freq[y] = freq.get(y, 0) + self.pmf(x)
-        return RandomVariable(*map(list, zip(*sorted(freq.items()))))
+        Y, i = np.unique(apply(f, self.X), return_inverse=True)
+        return RandomVariable.trusted(support(Y),
+                                      np.bincount(i, self.p, len(Y)))
 
     def map(self, f):
         """ Returns a new random variable with probabilities given by f. """
-        return RandomVariable(self, list(map(f, self)))
+        return RandomVariable(self, np.fromiter(map(f, self), np.float64,
+                                                len(self)))
 
     ### probability theory statistics
 
-    def E(self, f=lambda x: x) -> float:
-        """ Expected value of a pmf represented by a list. """
-        return sum(f(x)*p for x, p in zip(self, self.p))
+    def E(self, f=None) -> float:
+        """ Expected value of f(X), the identity by default. """
+        return self.ev[-1] if f is None else np.dot(apply(f, self.X), self.p)
 
     def Var(self) -> float:
         """ Var[X] = E[(x - u)^2] = E[X^2] - E[x]^2. """
-        return self.E(lambda x: x*x) - self.E()**2
+        return self.E(np.square) - self.E()**2
 
     def std(self) -> float:
         """ sigma^2 = Var[x] so sigma = standard deviation = sqrt(Var[X]). """
         return math.sqrt(self.Var())
 
+    def quantile(self, q: float) -> float:
+        """ Smallest value whose cmf is at least q, q may be an array. """
+        i = np.searchsorted(self.F[1:], q, "left")
+        return scalar(self.X[np.minimum(i, len(self.X) - 1)])
+
     def range(self) -> float:
         """ Maximum element minus the minimum element. """
         return self[-1] - self[0]
@@ -130,15 +184,50 @@ mean = {self.E():.3f} +/- {self.std():.3f} (std)"
     ### miscellaneous
 
     def capped(self, u: float) -> float:
-        """ Returns self.E(lambda x: max(x, u)) in O(log n). """
-        i = bisect.bisect(self, u)
-        return u*self.F[i] + query(self.ev, i, len(self.X) - 1)
+        """ Returns self.E(lambda x: max(x, u)) in O(log n) per value. """
+        i = np.searchsorted(self.X, u, "right")
+        return scalar(u*self.F[i] + (self.ev[-1] - self.ev[i]))
 
 ### sampling
 
-    def sample(self) -> float:
-        """ Samples a value from a random variable. """
-        return self[bisect.bisect(self.F, random.random()) - 1]
+    @cached_property
+    def alias(self) -> tuple:
+        """ Vose's alias table: each of the N columns keeps its own value
+        with some probability and otherwise gives the value it aliases. """
+        N = len(self.p)
+        scaled, keep, alias = self.p*(N/self.p.sum()), np.ones(N), \
+            np.arange(N)
+        small = [i for i in range(N) if scaled[i] < 1]
+        large = [i for i in range(N) if scaled[i] >= 1]
+        while small and large:
+            i, j = small.pop(), large.pop()
+            keep[i], alias[i] = scaled[i], j
+            # j gives away the rest of i's column
+            scaled[j] -= 1 - scaled[i]
+            (small if scaled[j] < 1 else large).append(j)
+        # whatever is left is 1 up to rounding and keeps its own value
+        return keep, alias
+
+    @cached_property
+    def columns(self) -> tuple:
+        """ The alias table as lists, faster to index one value at a time. """
+        keep, alias = self.alias
+        return keep.tolist(), self.X.tolist(), self.X[alias].tolist()
+
+    def sample(self, n: int=None, rng: np.random.Generator=None):
+        """ Samples a value, or an array of n values, in O(1) per value.
+        A single value is drawn from the random module unless rng is given,
+        arrays from the module's seeded generator unless rng is given. """
+        if n is None:
+            keep, own, other = self.columns
+            # one uniform picks the column and whether to keep it
+            u = (random.random() if rng is None else rng.random())*len(keep)
+            i = int(u)
+            return own[i] if u - i < keep[i] else other[i]
+        keep, alias = self.alias
+        U = (generator if rng is None else rng).random(n)*len(keep)
+        i = U.astype(np.int64)
+        return self.X[np.where(U - i < keep[i], i, alias[i])]
 
 def E(rv: RandomVariable, iters: int=ITERS) -> float:
     """ Expected value by repeatedly sampling a random variable. """
@@ -157,6 +246,7 @@ if __name__ == "__main__":
 
     print(rv.E(), rv.Var(), rv.std(), rv.range())
     print(E(rv), rv.sample(), rv.sample(), rv.sample())
+    print(rv.sample(5), rv.sample(10**6).mean())
 
     X = [ -2,  -1,   1,   2,   3]
     p = [0.1, 0.2, 0.5, 0.1, 0.1]
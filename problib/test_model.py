@@ -1,24 +1,35 @@
-import random, bisect, sys
-from . import prob, model
-from .testing import apply, adiff, fdiff
+import random, sys
+import numpy as np
+from . import prob, model, exact
+from .testing import apply, adiff, pdiff, fdiff
 
 random.seed(1)
-ITERS = 3*10**6
+rng = np.random.default_rng(1)
+SIMULATE = False # whether to cross-check the exact distributions by simulation
+EXACT_EPS = 10**-9 # tolerance of the exact distributions against the model
+BATCH = True # whether to simulate games in vectorized batches
+ITERS = 10**8 if BATCH else 3*10**6
+CHUNK = 10**5 # number of games simulated at once
+WORKERS = 1   # number of processes simulating batches, see parallel.py
 prob.R, prob.B = 30, 10
 model.ROLLS_AVAILABLE, model.ROLLS_CYCLE = True, 8
 model.ROLLS_F = 1/model.ROLLS_CYCLE
 model_type = model.Model
 
-count_Fr = [0]*(prob.R + 1)
-count_pr = [0]*(prob.R + 1)
-count_k  = [0]*prob.N
-count_rolls = [0]
-count_last = [0]*prob.N
+def histograms(R: int=prob.R) -> dict:
+    """ Empty histograms of the quantities counted by the simulation. """
+    return {"Fr": np.zeros(R + 1, dtype=np.int64),
+            "pr": np.zeros(R + 1, dtype=np.int64),
+            "k": np.zeros(prob.N, dtype=np.int64),
+            "rolls": np.zeros(1, dtype=np.int64),
+            "last": np.zeros(prob.N, dtype=np.int64)}
 
-def sample(X: list=prob.X, F: list=prob.F) -> float:
-    """ Samples a value from a random variable. """
-    p = random.random()
-    return X[bisect.bisect(F, p) - 1]
+counts = histograms()
+count_Fr, count_pr, count_k, count_rolls, count_last = counts.values()
+
+def sample(K: prob.RandomVariable=prob.K) -> float:
+    """ Samples a value from a random variable in O(1), see rv.alias. """
+    return K.sample()
 
 def E(X, iters: int=ITERS) -> float:
     """ Expected value by repeatedly sampling a random variable. """
@@ -69,11 +80,112 @@ def simulate(m: model.Model=model.Model(), index: int=0) -> float:
     # model didn't claim, kakera value of 0
     return 0
 
+def simulate_batch(m: model.Model, games: int, index: int=0,
+                   rng: np.random.Generator=rng,
+                   counts: dict=counts) -> np.ndarray:
+    """ Simulates games index, ..., index + games - 1 at once.
+    Follows the same rules as simulate, so the counts have the same law. """
+    R, B, dist = m.R, m.B, m.dist
+    N = dist.N
+    offset = R % B
+    # batch sizes and the number of rolls left at the end of each batch
+    sizes = ([offset] if offset > 0 else []) + [B]*(R//B)
+    ends = R - np.cumsum(sizes)
+    # the value at an index is claimed if the index is above the threshold
+    X = np.asarray(dist.X)
+    cutoff = np.searchsorted(X, [m.Ef(r) for r in ends], "right") - 1
+    draw = lambda U: np.minimum(
+        np.searchsorted(dist.F, U, "right") - 1, N - 1)
+
+    # the max of a batch of values is the value of the max of its uniforms
+    U = rng.random((games, R))
+    best = draw(np.maximum.reduceat(U, np.cumsum([0] + sizes[:-1]), axis=1))
+    claim = best > cutoff
+    j = np.argmax(claim, axis=1) # first batch worth claiming
+    claimed = claim.any(axis=1)
+    k = best[np.arange(games), j]
+
+    # $rolls extends the last batch by B if its best value is at most k*
+    if m.ROLLS_AVAILABLE:
+        kp = np.searchsorted(X, m.kp, "right") - 1
+        assert np.all(cutoff[:-1] >= kp), "$rolls only used on the last batch"
+        general = isinstance(m, model.GeneralModel)
+        # number of $rolls each game wants, and the best value after each
+        want = np.zeros(games, dtype=np.int64)
+        chain, active = [k], (j == len(sizes) - 1) & (k <= kp)
+        while active.any():
+            want += active
+            ext = chain[-1].copy()
+            ext[active] = np.maximum(ext[active],
+                                     draw(rng.random((active.sum(), B)).max(1)))
+            chain.append(ext)
+            active &= (ext <= kp) & general
+        # U_i = min(U_{i - 1} + want_i, s + A_i) for s the initial stock
+        A = np.cumsum((index + np.arange(games)) % m.ROLLS_CYCLE == 0)
+        W = np.cumsum(want)
+        U = W + np.minimum(np.minimum.accumulate(m.rolls_left + A - W), 0)
+        uses = np.diff(U, prepend=0)
+        m.rolls_left += A[-1] - U[-1]
+        k = np.stack(chain)[uses, np.arange(games)]
+        counts["rolls"][0] += U[-1]
+
+    # r is the number of rolls left before the claimed roll
+    r = ends[j] + 1
+    counts["pr"] += np.bincount(r[claimed], minlength=R + 1)
+    counts["Fr"] += np.cumsum(np.bincount(r[claimed], minlength=R + 1))
+    counts["k"] += np.bincount(k[claimed], minlength=N)
+    counts["last"] += np.bincount(k[claimed & (r == 1)], minlength=N)
+    return np.where(claimed, X[k], 0)
+
+def E_batch(m: model.Model, iters: int=ITERS, chunk: int=CHUNK) -> float:
+    """ Expected value by simulating games in batches. """
+    total = 0
+    for i in range(0, iters, chunk):
+        total += simulate_batch(m, min(chunk, iters - i), i).sum()
+    return total/iters
+
+def run(m: model.Model, iters: int=ITERS) -> float:
+    """ Expected value of the model by simulation, filling the counts. """
+    if not BATCH:
+        return sum(simulate(m, i) for i in range(iters))/iters
+    if WORKERS == 1:
+        return E_batch(m, iters)
+    from . import parallel
+    args = (m.R, m.B, m.ROLLS_AVAILABLE, m.ROLLS_CYCLE)
+    ev, partial, _ = parallel.simulate(iters, WORKERS, model_type=type(m),
+                                       args=args)
+    for name, count in partial.items():
+        counts[name] += count
+    return ev
+
+def check_exact(m: model.Model, tol: float=EXACT_EPS) -> tuple:
+    """ Checks the model's closed forms against the exact distributions of
+    the value, claim roll and $rolls used in a game, returning them. """
+    value, roll, uses = exact.game(m)
+    r = range(prob.R + 1)
+    pdiff(np.cumsum(roll.p).tolist(), apply(m.F_r, r), "exact cdf of f", True,
+          tol=tol)
+    pdiff(roll.p.tolist(), apply(m.p_r, r), "exact pdf of f", tol=tol)
+    pdiff(value.p.tolist(), apply(m.p_k), "exact pdf of k", tol=tol)
+    if model.ROLLS_AVAILABLE:
+        ev_old, Ez = prob.Ef(prob.R, prob.B), prob.Ef(prob.B, prob.B)
+        ev_new = ev_old + m.p_r(1)*(prob.E(apply(m.p_last)) - Ez)
+        adiff(value.E(), ev_new, "exact rolls expected value", tol)
+        assert uses.E() <= model.ROLLS_F, "overusing rolls"
+    else:
+        adiff(value.E(), prob.Ef(prob.R, prob.B), "exact expected value", tol)
+    return value, roll, uses
+
 if __name__ == "__main__":
     m = model_type(prob.R, prob.B, model.ROLLS_AVAILABLE, model.ROLLS_CYCLE)
+    value, _, uses = check_exact(m)
+    print(f"exact value: {value.E():.3f} +/- {value.std():.3f} (std), \
+median {value.quantile(0.5)}, $rolls used {uses.E():.3f} per game")
+    if not SIMULATE:
+        sys.exit()
     # adding rolls changes the random variable
     if model.ROLLS_AVAILABLE:
-        ev = sum(simulate(m, i) for i in range(ITERS))/ITERS
+        ev = run(m)
         f, fs = model.ROLLS_F, count_rolls[0]/ITERS
         ev_old, Ez = prob.Ef(prob.R, prob.B), prob.Ef(prob.B, prob.B)
         assert fs <= f, "overusing rolls"
@@ -98,7 +210,8 @@ if __name__ == "__main__":
     else:
         # whether the theoretical model aligns with the empirical expected value
         # no way to know whether this "optimal" value is truly optimal however
-        adiff(E(lambda: simulate(m)), prob.Ef(prob.R, prob.B), "expected value")
+        ev = run(m)
+        adiff(ev, prob.Ef(prob.R, prob.B), "expected value")
 
         ### testing introspection 
         # probability of getting to r rolls left
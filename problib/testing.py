@@ -3,16 +3,16 @@ from .rv import norm, norm_cmf, pmf, cmf, diff
 # comparing two scalars, comparing two lists
 EPSILON, LIST_EPS = 0.1, 0.01
 
-def apply(f, r: range=prob.X) -> list:
+def apply(f, r: range=None) -> list:
     """ Applies a function to a range. """
-    return list(map(f, r))
+    return list(map(f, prob.X if r is None else r))
 
 def adiff(x: float, y: float, s: str, tol: float=EPSILON) -> None:
     """ Asserts that two numbers are sufficiently close. """
     assert diff(x, y, tol), f"{s}: {x:.3f} != {y:.3f}"
 
 def pdiff(u: list, v: list, s: str, is_cmf: bool=False,
-          domain: list=prob.X, tol: float=LIST_EPS) -> None:
+          domain: list=None, tol: float=LIST_EPS) -> None:
     """ Whether each number in u is close enough to each number in v. """
     assert len(u) == len(v), f"{s}: lists are not of the same length"
     if is_cmf: